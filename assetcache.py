@@ -0,0 +1,121 @@
+import hashlib
+import os
+import struct
+
+from fltk import *
+
+from bundle import ROOT, asset_path, scaled_name
+
+# Pre-scaled images kept on disk as raw RGBA so a warm start needs neither PIL nor a PNG decode.
+# Files are named after a hash of the source image bytes and the size, so editing an image
+# or asking for another size just makes a new entry.
+# With an asset bundle the sizes it was built with come straight out of it, without a copy,
+# and other sizes are scaled from its decoded pixels instead of the PNG. A damaged bundle entry is
+# reported once and the loose PNG is used in its place.
+CACHE_VERSION = b"1"
+HEADER = struct.Struct("<4sII")  # b"RGBA", width, height
+MAGIC = b"RGBA"
+
+
+class AssetCache:
+    def __init__(self, folder=None, bundle=None):
+        self.folder = folder if folder is not None else os.path.join(ROOT, ".cache")
+        self.bundle = bundle
+        self.on_error = None  # Called with a message when the disk cache can't be written or a bundle entry is damaged
+        self.damaged = set()  # Bundle entries that failed their check, the loose files are used instead
+        self.hits = 0
+        self.misses = 0
+        self.buffers = {}  # Fl_RGB_Image doesn't copy its pixels, so they are kept alive here until release()
+
+    # (width, height, RGBA pixels) of a bundle entry, None if it isn't in the bundle or is damaged
+    def bundled(self, name):
+        if self.bundle is None or name not in self.bundle or name in self.damaged:
+            return None
+        try:
+            return self.bundle.image(name)
+        except ValueError as error:
+            self.damaged.add(name)
+            message = f"{error}, using the loose file"
+            print(f"Error. {message}")
+            if self.on_error is not None:
+                self.on_error(message)
+            return None
+
+    def path(self, source, width, height):
+        if self.bundled(source) is not None:  # Checked, so crc() can't fail
+            data = struct.pack("<I", self.bundle.crc(source))
+        else:
+            with open(asset_path(source), "rb") as file:
+                data = file.read()
+        digest = hashlib.sha1(CACHE_VERSION + data + struct.pack("<ii", width, height or 0))
+        return os.path.join(self.folder, digest.hexdigest()[:20] + ".rgba")
+
+    # Image scaled to width (and height, or keeping the aspect ratio when it isn't given)
+    def scaled(self, source, width, height=None):
+        w, h, pixels = self.pixels(source, width, height)
+        return self.image(pixels, w, h)
+
+    # FLTK image for raw RGBA pixels
+    def image(self, pixels, width, height):
+        try:
+            image = Fl_RGB_Image(pixels, width, height, 4)
+        except TypeError:  # FLTK builds that only take bytes get a copy of a bundle memoryview
+            pixels = bytes(pixels)
+            image = Fl_RGB_Image(pixels, width, height, 4)
+        self.buffers[id(image)] = pixels
+        return image
+
+    # Lets go of the pixels of an image that isn't used anymore
+    def release(self, image):
+        self.buffers.pop(id(image), None)
+
+    # (width, height, RGBA bytes) of a scaled image, for building other images out of it
+    def pixels(self, source, width, height=None):
+        image = self.bundled(scaled_name(source, width, height))
+        if image is not None:
+            self.hits += 1
+            return image
+
+        cached = self.path(source, width, height)
+        try:
+            with open(cached, "rb") as file:
+                data = file.read()
+            magic, w, h = HEADER.unpack_from(data)
+            if magic != MAGIC or len(data) != HEADER.size + w * h * 4:
+                raise ValueError(f"Damaged cache file {cached}")
+            pixels = data[HEADER.size:]
+            self.hits += 1
+        except (OSError, ValueError, struct.error):
+            self.misses += 1
+            w, h, pixels = self.resize(source, width, height)
+            self.store(cached, w, h, pixels)
+        return w, h, pixels
+
+    # Better image resizer (Thanks Mr. Ark), only needed when the cache is cold
+    def resize(self, source, width, height):
+        """resizes any image type using high quality PIL library"""
+        from PIL import Image
+
+        image = self.bundled(source)
+        if image is not None:
+            w, h, pixels = image
+            img = Image.frombuffer("RGBA", (w, h), pixels, "raw", "RGBA", 0, 1)
+        else:
+            img = Image.open(asset_path(source)).convert("RGBA")  # opens all image formats supported by PIL
+        if height is None:
+            height = int(width * img.height / img.width)  # correct aspect ratio
+        img = img.resize((width, height), Image.Resampling.BICUBIC)  # high quality resizing
+        return width, height, img.tobytes()
+
+    # Writes a cache entry, a read-only disk only means the next start is cold again
+    def store(self, cached, width, height, pixels):
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            temp = cached + ".tmp"
+            with open(temp, "wb") as file:
+                file.write(HEADER.pack(MAGIC, width, height))
+                file.write(pixels)
+            os.replace(temp, cached)
+        except OSError as error:
+            if self.on_error is not None:
+                self.on_error(f"Could not cache '{cached}' ({error})")
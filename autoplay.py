@@ -0,0 +1,68 @@
+from pieces import x_range
+
+
+# Plays a GameLoop through its key presses like a person would: when a piece spawns it asks
+# a policy where the piece should go (rotation, box x), then presses one key every delay frames
+# to get it there and drops it. Set it as loop.player and the loop calls step() every frame.
+class ScriptedPlayer:
+    def __init__(self, loop, policy, delay=2):
+        self.loop = loop
+        self.policy = policy
+        self.delay = delay  # Frames between two key presses
+        self.piece = -1
+        self.target = None
+        self.wait = 0
+        self.holding = None
+        self.last_state = None
+
+    def step(self):
+        loop = self.loop
+        game = loop.game
+        if self.holding is not None:  # Keys are only held for one frame
+            loop.release(self.holding)
+            self.holding = None
+        if game.over:
+            return
+
+        if game.spawns != self.piece:
+            self.piece = game.spawns
+            self.target = self.policy(game)
+            self.last_state = None
+            self.wait = self.delay
+
+        if self.wait > 0:
+            self.wait -= 1
+            return
+
+        action = self.next_action(game)
+        loop.press(action)
+        self.holding = action
+        self.wait = self.delay
+
+    # Which key gets the piece closer to its target, drop once it is there or it got stuck
+    def next_action(self, game):
+        state = (game.rotation, game.x)
+        stuck = state == self.last_state
+        self.last_state = state
+
+        rotation, x = self.target
+        if stuck:
+            return "drop"
+        if game.rotation != rotation:
+            return "ccw" if (rotation - game.rotation) % 4 == 3 else "cw"
+        if game.x < x:
+            return "right"
+        if game.x > x:
+            return "left"
+        return "drop"
+
+
+# Puts every piece in a random rotation and column
+class RandomPolicy:
+    def __init__(self, rng):
+        self.rng = rng
+
+    def __call__(self, game):
+        rotation = self.rng.randrange(4)
+        low, high = x_range(game.shape_num, rotation, game.board.width)
+        return rotation, self.rng.randint(low, high)
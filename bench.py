@@ -0,0 +1,307 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from cells import CellGrid, render_game
+from game import Game
+from pieces import spawn_at
+
+# Benchmarks of the game's hot paths on fixed boards. Everything runs headlessly, rendering goes
+# through StubGrid below. Results are ops/s and timing percentiles in microseconds, as JSON.
+
+
+# Headless stand-in for TileGrid: same dirty-cell bookkeeping, "draws" into a frame buffer of colors
+class StubGrid(CellGrid):
+    def __init__(self, cols, rows):
+        CellGrid.__init__(self, cols, rows)
+        self.framebuffer = bytearray(cols * rows)
+
+    def draw(self, full=False):
+        for i in self.take_dirty(full):
+            self.framebuffer[i] = self.color_at(i)
+
+
+# Game on an empty board with the first piece just spawned
+def empty_game(width=10, height=25):
+    game = Game(width=width, height=height)
+    game.reset(1)
+    game.new_shape()
+    return game
+
+
+# Game with the bottom 12 rows stacked, one hole in every row
+def stacked_game():
+    game = empty_game()
+    rng = random.Random(2)
+    board = game.board
+    for y in range(board.height - 12, board.height):
+        hole = rng.randrange(board.width)
+        board.place([(x, y) for x in range(board.width) if x != hole], rng.randrange(1, 8))
+    game.move_piece(game.rotation, game.x, game.y)
+    return game
+
+
+# 4 rows filled except the right column, with a standing I piece above the well
+def tetris_game(width=10, height=25):
+    game = empty_game(width, height)
+    board = game.board
+    for y in range(board.height - 4, board.height):
+        board.place([(x, y) for x in range(board.width - 1)], 3)
+    game.shape_num = 5
+    game.move_piece(1, board.width - 3, 5)
+    return game
+
+
+# The 100x200 marathon board, half of it stacked
+def huge_game():
+    game = empty_game(100, 200)
+    rng = random.Random(3)
+    board = game.board
+    for y in range(100, board.height):
+        hole = rng.randrange(board.width)
+        board.place([(x, y) for x in range(board.width) if x != hole], rng.randrange(1, 8))
+    game.move_piece(game.rotation, game.x, game.y)
+    return game
+
+
+FIXTURES = {"empty": empty_game, "stacked": stacked_game, "tetris": tetris_game, "huge": huge_game,
+            "huge_tetris": lambda: tetris_game(100, 200)}
+
+
+# Snapshot of a game so every run of a benchmark that changes the board starts from the same spot
+def save(game):
+    board = game.board
+    return (board.rows[:], bytearray(board.colors), board.tops[:], game.shape_num, game.rotation, game.x, game.y, game.score, game.lines, game.level, game.speed)
+
+
+def restore(game, state):
+    board = game.board
+    rows, colors, tops, game.shape_num, rotation, x, y, game.score, game.lines, game.level, game.speed = state
+    board.rows[:] = rows
+    board.colors[:] = colors
+    board.tops[:] = tops
+    game.over = False
+    game.move_piece(rotation, x, y)
+    game.events.clear()
+    game.damage = None
+
+
+# Back to the spawn position when the piece can't go further
+def respawn(game):
+    board = game.board
+    game.move_piece(*spawn_at(game.shape_num, board.width, board.hidden))
+
+
+# Each benchmark gets a fixture game and returns (setup, op): setup runs untimed before every op
+def bench_move_left_right(game):
+    def op():
+        if not game.move_left():
+            game.move_right()
+            game.move_right()
+    return None, op
+
+
+def bench_move_down(game):
+    def op():
+        if not game.move_down(True):
+            respawn(game)
+    return None, op
+
+
+def bench_rotate(game):
+    return None, game.rotate
+
+
+def bench_insta_down(game):
+    state = save(game)
+    return (lambda: restore(game, state)), game.insta_down
+
+
+def bench_new_shape(game):
+    state = save(game)
+    return (lambda: restore(game, state)), game.new_shape
+
+
+def bench_clear_lines(game):
+    # The landing of the piece is untimed, only the line clear is measured
+    state = save(game)
+
+    def setup():
+        restore(game, state)
+        game.move_piece(game.rotation, game.x, game.y + game.drop)
+        game.board.place(game.shape, game.color())
+    return setup, game.clear_lines
+
+
+def bench_render(game):
+    # One piece move plus handing the changed rows to the grid and drawing them
+    board = game.board
+    grid = StubGrid(board.width, board.height - board.hidden)
+    render_game(game, grid)
+    grid.draw(True)
+
+    def op():
+        if not game.move_left():
+            game.move_right()
+            game.move_right()
+        render_game(game, grid)
+        grid.draw()
+    return None, op
+
+
+def bench_clear_render(game):
+    # Worst frame: a clear moves everything above it, then all of it is drawn
+    board = game.board
+    grid = StubGrid(board.width, board.height - board.hidden)
+    render_game(game, grid)
+    grid.draw(True)
+    state = save(game)
+
+    def setup():
+        restore(game, state)
+        render_game(game, grid)
+        grid.draw()
+        game.move_piece(game.rotation, game.x, game.y + game.drop)
+        game.board.place(game.shape, game.color())
+
+    def op():
+        game.clear_lines()
+        render_game(game, grid)
+        grid.draw()
+    return setup, op
+
+
+# (name, fixture, benchmark)
+BENCHMARKS = [
+    ("move_left_right/empty", "empty", bench_move_left_right),
+    ("move_left_right/stacked", "stacked", bench_move_left_right),
+    ("move_down/empty", "empty", bench_move_down),
+    ("rotate/empty", "empty", bench_rotate),
+    ("rotate/stacked", "stacked", bench_rotate),
+    ("insta_down/empty", "empty", bench_insta_down),
+    ("insta_down/stacked", "stacked", bench_insta_down),
+    ("insta_down/tetris", "tetris", bench_insta_down),
+    ("clear_lines/tetris", "tetris", bench_clear_lines),
+    ("clear_lines/empty", "empty", bench_clear_lines),
+    ("new_shape/empty", "empty", bench_new_shape),
+    ("render/empty", "empty", bench_render),
+    ("render/stacked", "stacked", bench_render),
+    # 100x200, everything should stay far below a 16ms frame
+    ("move_down/huge", "huge", bench_move_down),
+    ("insta_down/huge", "huge", bench_insta_down),
+    ("clear_lines/huge_tetris", "huge_tetris", bench_clear_lines),
+    ("render/huge", "huge", bench_render),
+    ("clear_render/huge_tetris", "huge_tetris", bench_clear_render),
+]
+
+
+def percentile(times, p):
+    return times[min(int(len(times) * p / 100), len(times) - 1)]
+
+
+# Times runs calls of op, each one on its own so percentiles mean something
+def measure(setup, op, runs):
+    times = []
+    clock = time.perf_counter
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = clock()
+        op()
+        times.append(clock() - start)
+    times.sort()
+    total = sum(times)
+    return {"runs": runs, "ops_per_sec": round(runs / total, 1), "mean_us": round(total / runs * 1e6, 3),
+            "p50_us": round(percentile(times, 50) * 1e6, 3), "p90_us": round(percentile(times, 90) * 1e6, 3),
+            "p99_us": round(percentile(times, 99) * 1e6, 3)}
+
+
+# Building the whole window, only when FLTK (and a display) is there
+def bench_startup(runs):
+    try:
+        import tetris
+    except ImportError as error:
+        return {"skipped": str(error)}
+    times = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)  # The window keeps its scores in the current folder, not in the one bench runs from
+        try:
+            for _ in range(runs):
+                start = time.perf_counter()
+                try:
+                    window = tetris.Tetris(100, 100, 700, 700, "Tetris")
+                except Exception as error:
+                    return {"skipped": str(error)}
+                window.end()
+                times.append(time.perf_counter() - start)
+                window.scores.close()
+        finally:
+            os.chdir(cwd)
+    times.sort()
+    # Same units as measure(), so compare() checks startup for regressions too
+    return {"runs": runs, "mean_us": round(sum(times) / runs * 1e6, 3), "p50_us": round(percentile(times, 50) * 1e6, 3)}
+
+
+def run(runs, only=None):
+    results = {}
+    for name, fixture, benchmark in BENCHMARKS:
+        if only and only not in name:
+            continue
+        setup, op = benchmark(FIXTURES[fixture]())
+        measure(setup, op, min(runs, 1000))  # Warm up
+        results[name] = measure(setup, op, runs)
+    if not only or only in "startup":
+        results["startup"] = bench_startup(3)
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+
+
+# Benchmarks whose median got slower than threshold percent between two runs (the median
+# is compared rather than the mean, one descheduled run shouldn't count as a regression)
+def compare(old, new, threshold):
+    regressions = []
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if not before or "p50_us" not in before or "p50_us" not in result:
+            continue
+        change = (result["p50_us"] / before["p50_us"] - 1) * 100
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{name:28} {before['p50_us']:>10.2f} -> {result['p50_us']:>10.2f} us median {change:+7.1f}% {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the game's hot paths")
+    parser.add_argument("--runs", type=int, default=20000, help="timed calls per benchmark")
+    parser.add_argument("--only", help="only benchmarks whose name contains this")
+    parser.add_argument("--output", "-o", help="write the results here instead of standard output")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files instead")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent slower that counts as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as file:
+            old = json.load(file)
+        with open(args.compare[1]) as file:
+            new = json.load(file)
+        regressions = compare(old, new, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        sys.exit(0)
+
+    results = run(args.runs, args.only)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
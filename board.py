@@ -0,0 +1,129 @@
+# Playfield model for the game, no FLTK in here so the logic can run without a display.
+# Every row is one integer bitmask (bit x set = cell (x, y) filled) and the colors
+# live in a flat byte array (0 = empty, 1-7 = piece colors, 8 = gameover color).
+# self.tops is the skyline: the highest filled row of every column (height if the column is empty).
+class Board:
+    def __init__(self, width=10, height=25, hidden=5):
+        self.width = width
+        self.height = height
+        self.hidden = hidden  # Rows above the visible playfield where pieces can poke out
+        self.full_row = (1 << width) - 1
+        self.rows = []
+        self.colors = bytearray()
+        self.tops = []
+        self.clear()
+
+    # Empties the whole board
+    def clear(self):
+        self.rows = [0] * self.height
+        self.colors = bytearray(self.width * self.height)
+        self.tops = [self.height] * self.width
+
+    # True if (x, y) is a wall, the floor or a filled cell. Cells above the board are free
+    def blocked(self, x, y):
+        if x < 0 or x >= self.width or y >= self.height:
+            return True
+        if y < 0:
+            return False
+        return (self.rows[y] >> x) & 1 == 1
+
+    # True if every cell of a piece is free
+    def fits(self, cells):
+        for x, y in cells:
+            if self.blocked(x, y):
+                return False
+        return True
+
+    # True if cells shifted by (dx, dy) are all free, no new list needed
+    def fits_at(self, cells, dx, dy):
+        for x, y in cells:
+            if self.blocked(x + dx, y + dy):
+                return False
+        return True
+
+    # Color of a single cell
+    def color(self, x, y):
+        return self.colors[y * self.width + x]
+
+    # Locks a piece into the board
+    def place(self, cells, color):
+        for x, y in cells:
+            if y < 0:
+                continue
+            self.rows[y] |= 1 << x
+            self.colors[y * self.width + x] = color
+            if y < self.tops[x]:
+                self.tops[x] = y
+
+    # How many rows a piece can fall. When the piece is above the skyline this comes straight
+    # from the column tops, only a piece tucked under an overhang checks the rows below it
+    def drop_distance(self, cells):
+        distance = self.height
+        for x, y in cells:
+            top = self.tops[x]
+            if y >= top:
+                return self.scan_drop(cells)
+            if top - y - 1 < distance:
+                distance = top - y - 1
+        return distance
+
+    def scan_drop(self, cells):
+        distance = 0
+        while self.fits([(x, y + distance + 1) for x, y in cells]):
+            distance += 1
+        return distance
+
+    # Removes every full row in a single pass from the bottom up, each row that stays is moved
+    # straight to its final place. Returns the cleared rows from top to bottom
+    def clear_full_rows(self):
+        w = self.width
+        rows = self.rows
+        colors = self.colors
+        cleared = []
+
+        write = self.height - 1
+        for y in range(self.height - 1, -1, -1):
+            if rows[y] == self.full_row:
+                cleared.append(y)
+                continue
+            if write != y:
+                rows[write] = rows[y]
+                colors[write * w:(write + 1) * w] = colors[y * w:(y + 1) * w]
+            write -= 1
+
+        # Rows left over at the top are empty
+        if cleared:
+            for y in range(write + 1):
+                rows[y] = 0
+            colors[:(write + 1) * w] = bytes((write + 1) * w)
+            self.update_tops()
+
+        cleared.reverse()
+        return cleared
+
+    # Pushes everything up by count rows and fills the bottom with full rows that have a hole at
+    # column hole. Cells pushed off the top are gone
+    def add_garbage(self, count, hole, color):
+        w = self.width
+        count = min(count, self.height)
+        row = self.full_row & ~(1 << hole)
+        self.rows[:] = self.rows[count:] + [row] * count
+        line = bytearray([color]) * w
+        line[hole] = 0
+        self.colors[:] = self.colors[count * w:] + line * count
+        self.update_tops()
+
+    # Rebuilds the skyline, stops as soon as every column has been found
+    def update_tops(self):
+        tops = [self.height] * self.width
+        missing = self.full_row
+        for y in range(self.height):
+            found = self.rows[y] & missing
+            while found:
+                bit = found & -found
+                tops[bit.bit_length() - 1] = y
+                found ^= bit
+            missing &= ~self.rows[y]
+            if not missing:
+                break
+        self.tops = tops
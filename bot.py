@@ -0,0 +1,120 @@
+import numpy as np
+
+from pieces import ROTATIONS, x_range
+
+# Weights for the board features, from the usual hand tuned Tetris AI heuristic
+HEIGHT_WEIGHT = -0.510066
+LINES_WEIGHT = 0.760666
+HOLES_WEIGHT = -0.35663
+BUMPINESS_WEIGHT = -0.184483
+
+
+# Every (rotation, box x) a shape can be dropped at on a board width wide, with the cell offsets as arrays
+class Placements:
+    def __init__(self, shape, width):
+        self.moves = []
+        dx = []
+        dy = []
+        seen = set()
+        for rotation in range(4):
+            cells = ROTATIONS[shape][rotation]
+            # Squares and the like look the same in several rotations, only keep one of them
+            low_x = min(x for x, y in cells)
+            low_y = min(y for x, y in cells)
+            key = frozenset((x - low_x, y - low_y) for x, y in cells)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            low, high = x_range(shape, rotation, width)
+            for x in range(low, high + 1):
+                self.moves.append((rotation, x))
+                dx.append([x + cx for cx, cy in cells])
+                dy.append([cy for cx, cy in cells])
+        self.columns = np.array(dx)  # (moves, 4) board columns of the cells
+        self.dy = np.array(dy)  # (moves, 4) row offsets of the cells inside the box
+
+
+# Picks where every piece should go by dropping it in each rotation and column and scoring the boards
+# that come out (height, holes, bumpiness and lines). All the candidate boards are scored at once
+# with NumPy, and with lookahead every placement of the next piece is tried on each of them as well.
+class Bot:
+    def __init__(self, lookahead=True):
+        self.lookahead = lookahead
+        self.placements = {}  # (shape, width) -> Placements
+
+    def moves(self, shape, width):
+        placements = self.placements.get((shape, width))
+        if placements is None:
+            placements = Placements(shape, width)
+            self.placements[(shape, width)] = placements
+        return placements
+
+    # Used as a ScriptedPlayer policy: returns (rotation, box x) for the falling piece
+    def __call__(self, game):
+        rotation, x, score = self.best(game)
+        return rotation, x
+
+    # Best placement for the falling piece, also gives its score
+    def best(self, game):
+        board = game.board
+        cells = np.zeros((board.height, board.width), dtype=bool)
+        for y, row in enumerate(board.rows):
+            if row:
+                cells[y] = (row >> np.arange(board.width)) & 1
+        boards = cells[None]
+
+        placements = self.moves(game.shape_num, board.width)
+        results, scores, valid, lines = self.drop(boards, placements)
+        if self.lookahead and game.next_shape_num >= 0:
+            # Score of a placement = score of the best placement of the next piece after it, plus the
+            # lines this piece clears, which the boards after the next piece don't show anymore
+            next_placements = self.moves(game.next_shape_num, board.width)
+            after, next_scores, next_valid, next_lines = self.drop(results, next_placements)
+            next_scores = np.where(next_valid, next_scores, -np.inf).reshape(len(results), -1)
+            scores = np.where(next_valid.reshape(len(results), -1).any(axis=1),
+                              next_scores.max(axis=1) + LINES_WEIGHT * lines, scores)
+
+        scores = np.where(valid, scores, -np.inf)
+        best = int(np.argmax(scores))
+        rotation, x = placements.moves[best]
+        return rotation, x, float(scores[best])
+
+    # Drops every placement on every board, boards is (n, height, width).
+    # Returns the (n * moves) resulting boards with full lines removed, their scores, which are valid
+    # and how many lines each cleared
+    def drop(self, boards, placements):
+        n, height, width = boards.shape
+        moves = len(placements.moves)
+
+        # Landing row of every placement from the skyline of each board
+        filled = boards.any(axis=1)
+        tops = np.where(filled, boards.argmax(axis=1), height)  # (n, width) highest filled row per column
+        land = (tops[:, placements.columns] - placements.dy[None]).min(axis=2) - 1  # (n, moves) box y
+        ys = land[:, :, None] + placements.dy[None]  # (n, moves, 4)
+        valid = (ys >= 0).all(axis=2).reshape(-1)
+
+        results = np.repeat(boards, moves, axis=0)  # (n * moves, height, width)
+        index = np.arange(n * moves)[:, None]
+        results[index, np.clip(ys, 0, height - 1).reshape(-1, 4), np.tile(placements.columns, (n, 1))] = True
+
+        # Clear the full lines by sorting them to the top and emptying them
+        full = results.all(axis=2)
+        lines = full.sum(axis=1)
+        if lines.any():
+            order = np.argsort(~full, axis=1, kind="stable")
+            results = np.take_along_axis(results, order[:, :, None], axis=1)
+            results[np.arange(height)[None] < lines[:, None]] = False
+
+        return results, self.score(results, lines), valid, lines
+
+    # Scores boards that already had their lines cleared
+    def score(self, boards, lines):
+        height = boards.shape[1]
+        filled = boards.any(axis=1)
+        tops = np.where(filled, boards.argmax(axis=1), height)
+        heights = height - tops
+        holes = (heights - boards.sum(axis=1)).sum(axis=1)
+        bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+        return (HEIGHT_WEIGHT * heights.sum(axis=1) + LINES_WEIGHT * lines + HOLES_WEIGHT * holes
+                + BUMPINESS_WEIGHT * bumpiness)
@@ -0,0 +1,208 @@
+import argparse
+import glob
+import mmap
+import os
+import struct
+import time
+import wave
+import zlib
+
+# All images and sound effects packed into one file (assets.bundle), built once with python bundle.py.
+# Images are stored as decoded RGBA, both at their own size and prescaled to the sizes the window
+# uses at scale 1, sound effects as the PCM samples of their WAV. The game memory-maps the file at
+# startup and hands out memoryviews into it, nothing is opened, decoded or copied per asset.
+# Entries are checked against their crc32 the first time they are used.
+#
+# File: HEADER, then the index (per entry a length byte, the name and ENTRY), then the data,
+# every entry starting on an ALIGN byte boundary.
+#   IMAGE entries: a = width, b = height, c = 4 bytes per pixel
+#   SOUND entries: a = sample rate, b = channels, c = bytes per sample
+MAGIC = b"TTAB"
+VERSION = 1
+HEADER = struct.Struct("<4sBIII")  # magic, version, entries, index size, index crc32
+ENTRY = struct.Struct("<BQIIIII")  # kind, offset, size, a, b, c, crc32
+IMAGE, SOUND = range(2)
+ALIGN = 16
+
+# Assets are found next to the code, wherever the game is started from
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUNDLE_FILE = os.path.join(ROOT, "assets.bundle")
+
+# Sizes every tile and the logo get prescaled to, (width, height) with height 0 keeping the aspect ratio
+TILE_SIZES = [(25, 25), (18, 18), (14, 14), (10, 10), (1, 1)]
+PRESCALED = {f"Images/color{color}.png": TILE_SIZES for color in range(1, 9)}
+PRESCALED["Images/logo.png"] = [(300, 0)]
+
+
+# Path of an asset like "Images/logo.png"
+def asset_path(name):
+    return os.path.join(ROOT, name)
+
+
+# "22050 Hz, 2 channels, 16 bit" for a sound format
+def format_name(rate, channels, width):
+    return f"{rate} Hz, {channels} channels, {width * 8} bit"
+
+
+# Entry name of an image prescaled to a size
+def scaled_name(source, width, height=None):
+    return f"{source}@{width}x{height or 0}"
+
+
+# A bundle file mapped into memory. get(), image() and sound() raise ValueError for a missing or
+# damaged entry, saying which one
+class Bundle:
+    def __init__(self, path=BUNDLE_FILE):
+        self.path = path
+        with open(path, "rb") as file:
+            try:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as error:  # Empty file
+                raise ValueError(f"Asset bundle {path} is empty") from error
+        self.entries = {}  # name -> (kind, offset, size, a, b, c, crc)
+        self.checked = set()
+
+        try:
+            magic, version, count, index_size, index_crc = HEADER.unpack_from(self.data)
+            index = self.data[HEADER.size:HEADER.size + index_size]
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an asset bundle")
+            if version != VERSION:
+                raise ValueError(f"Unsupported asset bundle version {version} in {path}")
+            if zlib.crc32(index) != index_crc:
+                raise ValueError(f"Asset bundle {path} has a damaged index")
+            pos = 0
+            for _ in range(count):
+                size = index[pos]
+                name = index[pos + 1:pos + 1 + size].decode()
+                pos += 1 + size
+                self.entries[name] = ENTRY.unpack_from(index, pos)
+                pos += ENTRY.size
+        except (struct.error, IndexError, UnicodeDecodeError) as error:
+            raise ValueError(f"Asset bundle {path} is damaged") from error
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    # Names of the entries of one kind, sorted
+    def names(self, kind):
+        return sorted(name for name, entry in self.entries.items() if entry[0] == kind)
+
+    def crc(self, name):
+        return self.get(name)[-1]
+
+    # (kind, data as a memoryview, a, b, c, crc) of an entry
+    def get(self, name):
+        entry = self.entries.get(name)
+        if entry is None:
+            raise ValueError(f"Asset bundle {self.path} has no '{name}', rebuild it with python bundle.py")
+        kind, offset, size, a, b, c, crc = entry
+        if offset + size > len(self.data):
+            raise ValueError(f"Asset bundle {self.path} is cut short at '{name}', rebuild it with python bundle.py")
+        data = memoryview(self.data)[offset:offset + size]
+        if name not in self.checked:
+            if zlib.crc32(data) != crc:
+                raise ValueError(f"Asset bundle {self.path} has a damaged '{name}', rebuild it with python bundle.py")
+            self.checked.add(name)
+        return kind, data, a, b, c, crc
+
+    # (width, height, RGBA pixels) of an image
+    def image(self, name):
+        kind, data, width, height, depth, crc = self.get(name)
+        if kind != IMAGE:
+            raise ValueError(f"'{name}' in {self.path} is not an image")
+        return width, height, data
+
+    # (sample rate, channels, bytes per sample, PCM samples) of a sound
+    def sound(self, name):
+        kind, data, rate, channels, width, crc = self.get(name)
+        if kind != SOUND:
+            raise ValueError(f"'{name}' in {self.path} is not a sound")
+        return rate, channels, width, data
+
+
+# The bundle if there is one, None means the loose files are used. A damaged bundle is reported
+# (also to on_error) and skipped
+def open_bundle(path=BUNDLE_FILE, on_error=None):
+    try:
+        return Bundle(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as error:
+        message = f"{error}, using the loose asset files"
+        print(f"Error. {message}")
+        if on_error is not None:
+            on_error(message)
+        return None
+
+
+# Packs Images/*.png and Sounds/*.wav into path. The song isn't in it, VLC streams it from its file.
+# The mixer plays every effect in one format, so a WAV in another one raises ValueError
+def build(path=BUNDLE_FILE):
+    from PIL import Image
+
+    entries = []  # (name, kind, data, a, b, c)
+    for source in sorted(glob.glob(asset_path("Images/*.png"))):
+        name = "Images/" + os.path.basename(source)
+        img = Image.open(source).convert("RGBA")
+        entries.append((name, IMAGE, img.tobytes(), img.width, img.height, 4))
+        for width, height in PRESCALED.get(name, ()):
+            scaled_height = height or int(width * img.height / img.width)  # correct aspect ratio
+            scaled = img.resize((width, scaled_height), Image.Resampling.BICUBIC)
+            entries.append((scaled_name(name, width, height), IMAGE, scaled.tobytes(), width, scaled_height, 4))
+    first = None  # (name, format) of the first sound, the others must match it
+    for source in sorted(glob.glob(asset_path("Sounds/*.wav"))):
+        name = "Sounds/" + os.path.basename(source)
+        with wave.open(source, "rb") as sound:
+            samples = sound.readframes(sound.getnframes())
+            sound_format = (sound.getframerate(), sound.getnchannels(), sound.getsampwidth())
+        if first is None:
+            first = (name, sound_format)
+        elif sound_format != first[1]:
+            raise ValueError(f"{name} is {format_name(*sound_format)} but {first[0]} is {format_name(*first[1])}, "
+                             f"convert the sounds to one format")
+        entries.append((name, SOUND, samples, *sound_format))
+
+    start = HEADER.size + sum(1 + len(name.encode()) + ENTRY.size for name, *rest in entries)  # First data byte
+    index = bytearray()
+    body = bytearray()
+    for name, kind, data, a, b, c in entries:
+        body += bytes(-(start + len(body)) % ALIGN)
+        encoded = name.encode()
+        index.append(len(encoded))
+        index += encoded
+        index += ENTRY.pack(kind, start + len(body), len(data), a, b, c, zlib.crc32(data))
+        body += data
+
+    temp = path + ".tmp"
+    with open(temp, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(entries), len(index), zlib.crc32(index)))
+        file.write(index)
+        file.write(body)
+    os.replace(temp, path)
+    return len(entries), HEADER.size + len(index) + len(body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packs the images and sounds into one asset bundle")
+    parser.add_argument("--output", "-o", default=BUNDLE_FILE)
+    parser.add_argument("--check", action="store_true", help="verify every entry of an existing bundle instead")
+    args = parser.parse_args()
+
+    if args.check:
+        try:
+            bundle = Bundle(args.output)
+            for name in bundle.entries:
+                bundle.get(name)
+        except (OSError, ValueError) as error:
+            print(f"Error. {error}")
+            raise SystemExit(1)
+        print(f"{args.output}: {len(bundle.entries)} entries OK")
+    else:
+        start = time.perf_counter()
+        try:
+            entries, size = build(args.output)
+        except (OSError, ValueError, wave.Error) as error:
+            print(f"Error. {error}")
+            raise SystemExit(1)
+        print(f"{args.output}: {entries} entries, {size / 1024:.0f} KiB in {time.perf_counter() - start:.2f}s")
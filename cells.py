@@ -0,0 +1,81 @@
+# Bookkeeping for a grid of colored cells that only repaints what changed, without any drawing,
+# so it can be used by the FLTK TileGrid and by headless stand-ins (benchmarks) alike.
+# Cells hold color numbers row by row, changed cells are collected in self.dirty until drawn.
+class CellGrid:
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.cells = bytearray(cols * rows)
+        self.dirty = set()
+        self.flashing = {}  # row -> color drawn over that row, for clear animations
+
+    # Called whenever something needs repainting, the widget asks for a redraw here
+    def changed(self):
+        pass
+
+    # Changes the color of one cell
+    def set(self, x, y, color):
+        i = y * self.cols + x
+        if self.cells[i] != color:
+            self.cells[i] = color
+            self.dirty.add(i)
+            self.changed()
+
+    # Changes the colors of whole rows at once, starting at row first, colors is row by row like self.cells.
+    # Rows that are the same as before are skipped with one comparison each
+    def set_rows(self, first, colors):
+        cells = self.cells
+        cols = self.cols
+        start = first * cols
+        for row in range(0, len(colors), cols):
+            new = colors[row:row + cols]
+            if cells[start + row:start + row + cols] == new:
+                continue
+            for i in range(row, row + len(new)):
+                if cells[start + i] != colors[i]:
+                    cells[start + i] = colors[i]
+                    self.dirty.add(start + i)
+        if self.dirty:
+            self.changed()
+
+    # Changes the color of every cell at once
+    def set_all(self, colors):
+        self.set_rows(0, colors)
+
+    # Draws the given rows in one color on top of their cells until unflash() is called
+    def flash(self, rows, color):
+        for row in rows:
+            self.flashing[row] = color
+            self.dirty.update(range(row * self.cols, (row + 1) * self.cols))
+        self.changed()
+
+    def unflash(self):
+        for row in self.flashing:
+            self.dirty.update(range(row * self.cols, (row + 1) * self.cols))
+        self.flashing = {}
+        self.changed()
+
+    # Empties the grid
+    def clear(self):
+        self.set_all(bytes(len(self.cells)))
+
+    # Cells to paint this frame (all of them if full), the dirty set starts over
+    def take_dirty(self, full=False):
+        cells = range(len(self.cells)) if full else self.dirty
+        self.dirty = set()
+        return cells
+
+    # Color a cell should be painted in right now
+    def color_at(self, i):
+        return self.flashing.get(i // self.cols, self.cells[i])
+
+
+# Copies the rows of a game that changed since the last call into a grid of its visible rows
+def render_game(game, grid):
+    damage = game.pop_damage()
+    if damage is None:
+        return
+    board = game.board
+    top = max(damage[0], board.hidden)  # Hidden rows aren't drawn
+    if top < damage[1]:
+        grid.set_rows(top - board.hidden, game.view(top, damage[1]))
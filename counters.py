@@ -0,0 +1,60 @@
+from loop import FRAME
+
+CLEAR_NAMES = ["", "Singles", "Doubles", "Triples", "Tetrises"]
+
+
+# Live statistics of one game, every event costs O(1) no matter how long the game runs.
+# Time is game time (frames), so the numbers of a replay match the game it recorded.
+# A shape's drought is the number of pieces since it last showed up, the current one is worked
+# out from where it was last seen, so a spawn only touches the shape that spawned.
+class Counters:
+    def __init__(self, shapes=7):
+        self.shapes = shapes
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.shapes
+        self.last_seen = [0] * self.shapes  # Piece number each shape last spawned at
+        self.max_droughts = [0] * self.shapes  # Longest drought that has ended
+        self.clears = [0] * len(CLEAR_NAMES)  # Line clears by how many lines went at once
+        self.pieces = 0
+        self.inputs = 0
+        self.frames = 0
+
+    def spawn(self, shape):
+        self.pieces += 1
+        drought = self.pieces - self.last_seen[shape] - 1
+        if drought > self.max_droughts[shape]:
+            self.max_droughts[shape] = drought
+        self.last_seen[shape] = self.pieces
+        self.counts[shape] += 1
+
+    def clear(self, lines):
+        self.clears[lines] += 1
+
+    def input(self):
+        self.inputs += 1
+
+    def frame(self, frames=1):
+        self.frames += frames
+
+    # Pieces since the shape last showed up
+    def drought(self, shape):
+        return self.pieces - self.last_seen[shape]
+
+    def max_drought(self, shape):
+        return max(self.max_droughts[shape], self.drought(shape))
+
+    # Pieces per second
+    def pps(self):
+        seconds = self.frames * FRAME
+        return self.pieces / seconds if seconds else 0.0
+
+    # Inputs (key presses) per minute
+    def apm(self):
+        minutes = self.frames * FRAME / 60
+        return self.inputs / minutes if minutes else 0.0
+
+    # Line clears by type, e.g. {"Singles": 3, ...}
+    def clear_types(self):
+        return {CLEAR_NAMES[lines]: self.clears[lines] for lines in range(1, len(CLEAR_NAMES))}
@@ -0,0 +1,148 @@
+import argparse
+import time
+
+import numpy as np
+
+from game import LAND_POINTS, LINE_POINTS, MAX_LEVEL
+from pieces import ROTATIONS, piece_cells, spawn_at, x_range
+
+
+# N games played in lockstep for training placement agents, Gym style: reset() and step(actions).
+# One action puts the falling piece of a game in rotation action // width with its box at
+# column action % width (pulled back inside the walls) and hard drops it, so a step is one piece.
+# All the state lives in NumPy arrays and the observation hands out the arrays themselves:
+#   boards (n, height, width) uint8, 1 = filled
+#   shapes (n,) falling piece of every game, next_shapes (n,) the piece after it
+# Pieces come from 7-bags like in Game, every game has its own shuffled bag.
+# Games that end are started over in the same step, their final score is in info["final_scores"].
+class VecTetris:
+    def __init__(self, n, width=10, height=25, seed=None, line_points=LINE_POINTS, land_points=LAND_POINTS,
+                 max_level=MAX_LEVEL):
+        self.n = n
+        self.width = width
+        self.height = height
+        self.actions = 4 * width
+        self.rng = np.random.default_rng(seed)
+        self.line_points = np.array(line_points)
+        self.land_points = land_points
+        self.max_level = max_level
+
+        # Shape tables indexed by [shape, rotation]
+        cells = np.array(ROTATIONS)  # (7, 4, 4, 2)
+        self.dx = cells[..., 0]
+        self.dy = cells[..., 1]
+        ranges = np.array([[x_range(shape, rotation, width) for rotation in range(4)] for shape in range(len(ROTATIONS))])
+        self.x_low = ranges[..., 0]
+        self.x_high = ranges[..., 1]
+        spawns = np.array([piece_cells(n, *spawn_at(n, width)) for n in range(len(ROTATIONS))])  # (7, 4, 2) spawn cells, used to check for gameover
+        self.spawn_x = spawns[..., 0]
+        self.spawn_y = spawns[..., 1]
+
+        self.boards = np.zeros((n, height, width), dtype=np.uint8)
+        self.shapes = np.zeros(n, dtype=np.int64)
+        self.next_shapes = np.zeros(n, dtype=np.int64)
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.lines = np.zeros(n, dtype=np.int64)
+        self.levels = np.ones(n, dtype=np.int64)
+        self.pieces = np.zeros(n, dtype=np.int64)
+        self.bags = np.zeros((n, len(ROTATIONS)), dtype=np.int64)
+        self.bag_pos = np.full(n, len(ROTATIONS))  # Next piece of every bag, a full bag means it is used up
+        self.everyone = np.ones(n, dtype=bool)
+        self.index = np.arange(n)
+        self.rows = np.arange(height)
+
+    def observe(self):
+        return {"boards": self.boards, "shapes": self.shapes, "next_shapes": self.next_shapes,
+                "scores": self.scores, "lines": self.lines, "levels": self.levels}
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.start(self.everyone)
+        return self.observe()
+
+    # Takes the next piece from the bag of every game where games is True, new bags are shuffled as needed
+    def deal(self, games):
+        empty = games & (self.bag_pos == len(ROTATIONS))
+        count = int(empty.sum())
+        if count:
+            self.bags[empty] = self.rng.permuted(np.tile(np.arange(len(ROTATIONS)), (count, 1)), axis=1)
+            self.bag_pos[empty] = 0
+        shapes = self.bags[games, self.bag_pos[games]]
+        self.bag_pos[games] += 1
+        return shapes
+
+    # Starts the games where games is True over
+    def start(self, games):
+        self.boards[games] = 0
+        self.bag_pos[games] = len(ROTATIONS)
+        self.shapes[games] = self.deal(games)
+        self.next_shapes[games] = self.deal(games)
+        self.scores[games] = 0
+        self.lines[games] = 0
+        self.levels[games] = 1
+        self.pieces[games] = 1
+
+    # Drops one piece in every game, returns (observation, rewards, dones, info)
+    def step(self, actions):
+        actions = np.asarray(actions)
+        boards = self.boards
+        shapes = self.shapes
+        rotations = actions // self.width
+        xs = np.clip(actions % self.width, self.x_low[shapes, rotations], self.x_high[shapes, rotations])
+        columns = xs[:, None] + self.dx[shapes, rotations]  # (n, 4)
+        dy = self.dy[shapes, rotations]
+
+        # Landing row from the skyline of every board
+        filled = boards.any(axis=1)
+        tops = np.where(filled, boards.argmax(axis=1), self.height)
+        land = (np.take_along_axis(tops, columns, axis=1) - dy).min(axis=1) - 1
+        ys = land[:, None] + dy
+        fits = ys.min(axis=1) >= 0
+        boards[self.index[:, None], np.maximum(ys, 0), columns] = 1
+
+        # Line clears, only the boards that have full lines get their rows sorted
+        full = boards.all(axis=2)
+        lines = full.sum(axis=1)
+        clearing = np.flatnonzero(lines)
+        if clearing.size:
+            order = np.argsort(~full[clearing], axis=1, kind="stable")  # Full lines to the top, others keep their order
+            cleared = np.take_along_axis(boards[clearing], order[:, :, None], axis=1)
+            cleared[self.rows[None] < lines[clearing, None]] = 0
+            boards[clearing] = cleared
+
+        rewards = self.line_points[lines] + self.land_points
+        self.scores += rewards
+        self.lines += lines
+        self.levels[:] = np.minimum(self.lines // 10 + 1, self.max_level)
+        self.pieces += 1
+
+        # Next piece, gameover when it has no room to spawn
+        shapes[:] = self.next_shapes
+        self.next_shapes[:] = self.deal(self.everyone)
+        blocked = boards[self.index[:, None], self.spawn_y[shapes], self.spawn_x[shapes]].any(axis=1)
+        dones = ~fits | blocked
+
+        info = {}
+        if dones.any():
+            info["final_scores"] = self.scores[dones].copy()
+            info["final_lines"] = self.lines[dones].copy()
+            self.start(dones)
+        return self.observe(), rewards, dones, info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures how many steps per second the vectorized environment runs")
+    parser.add_argument("--envs", type=int, default=1024)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    env = VecTetris(args.envs, seed=args.seed)
+    env.reset()
+    actions = np.random.default_rng(args.seed).integers(0, env.actions, (args.steps, args.envs))
+    start = time.perf_counter()
+    for step in range(args.steps):
+        env.step(actions[step])
+    seconds = time.perf_counter() - start
+    print(f"{args.envs * args.steps / seconds:,.0f} steps/s ({args.envs} envs, {args.steps} steps in {seconds:.2f}s)")
@@ -0,0 +1,156 @@
+import argparse
+import collections
+import json
+import os
+import time
+
+from board import Board
+from bundle import ROOT
+from pieces import KICKS, ROTATIONS, SHAPE_NAMES, spawn_at, x_range
+
+# Finesse: the fewest key presses that take a piece from its spawn to where it lands, on an open board.
+# A breadth first search over (rotation, x, y) states finds them for every shape once, the tables are
+# cached on disk per board width and the trainer only looks the landed piece up in them.
+# Moves are single key presses: a tap left/right, left/right held until the wall (DAS) or a rotation.
+# Placements that look the same (the I piece flat in state 0 or 2 on the same columns) share an entry.
+MOVES = ["left", "right", "cw", "ccw", "das_left", "das_right"]
+COUNTED = {"left", "right", "cw", "ccw"}  # Inputs that are presses in the table, DAS is one left or right press
+TABLE_VERSION = 1  # Bump when spawns, kicks or moves change
+CACHE_FOLDER = os.path.join(ROOT, ".cache")
+
+
+# Columns and shape of a landed piece, the same for every rotation that covers the same cells
+def footprint(shape, rotation, x):
+    cells = ROTATIONS[shape][rotation]
+    top = min(y for cx, y in cells)
+    return tuple(sorted((x + cx, y - top) for cx, y in cells))
+
+
+# State after one move, the same state if the piece can't move
+def apply(board, shape, state, move):
+    rotation, x, y = state
+    cells = ROTATIONS[shape][rotation]
+    if move in ("left", "right"):
+        dx = -1 if move == "left" else 1
+        return (rotation, x + dx, y) if board.fits_at(cells, x + dx, y) else state
+    if move in ("das_left", "das_right"):
+        low, high = x_range(shape, rotation, board.width)
+        return rotation, low if move == "das_left" else high, y
+    turn = 1 if move == "cw" else -1
+    rotation = (rotation + turn) % 4
+    for dx, dy in KICKS[shape][state[0]][turn]:
+        if board.fits_at(ROTATIONS[shape][rotation], x + dx, y + dy):
+            return rotation, x + dx, y + dy
+    return state
+
+
+# footprint -> shortest list of moves for one shape on a board width wide
+def search(shape, width):
+    board = Board(width)
+    start = spawn_at(shape, width, board.hidden)
+    paths = {start: []}
+    queue = collections.deque([start])
+    while queue:
+        state = queue.popleft()
+        for move in MOVES:
+            following = apply(board, shape, state, move)
+            if following not in paths:
+                paths[following] = paths[state] + [move]
+                queue.append(following)
+
+    table = {}
+    for (rotation, x, y), moves in paths.items():
+        key = footprint(shape, rotation, x)
+        if key not in table or len(moves) < len(table[key]):
+            table[key] = moves
+    return table
+
+
+# Tables of every shape for a board width, built and cached on the first use of that width
+def load_tables(width, folder=CACHE_FOLDER):
+    path = os.path.join(folder, f"finesse-{width}.json")
+    try:
+        with open(path, "r") as file:
+            data = json.load(file)
+        if data["version"] == TABLE_VERSION and data["width"] == width and len(data["shapes"]) == len(ROTATIONS):
+            return [{tuple(tuple(cell) for cell in key): moves for key, moves in shape} for shape in data["shapes"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    tables = [search(shape, width) for shape in range(len(ROTATIONS))]
+    data = {"version": TABLE_VERSION, "width": width,
+            "shapes": [[[key, moves] for key, moves in table.items()] for table in tables]}
+    try:  # Without a writable disk the tables are just built again next time
+        os.makedirs(folder, exist_ok=True)
+        with open(path + ".tmp", "w") as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+    return tables
+
+
+# Counts the presses for every piece and checks them against the tables when it lands.
+# GameLoop hands it every press as a frame plays it, with the number of the piece it was played on,
+# and the window calls land() from the game events
+class FinesseTrainer:
+    def __init__(self, width=10):
+        self.tables = load_tables(width)
+        self.reset()
+
+    def reset(self):
+        self.inputs = []  # (piece, action) presses not checked yet
+        self.pieces = 0  # Pieces checked
+        self.faults = 0  # Pieces placed with more presses than needed
+        self.extra = 0  # Presses over the minimum, all pieces together
+        self.last = None  # (presses, shortest moves) of the last checked piece
+
+    def press(self, action, piece):
+        self.inputs.append((piece, action))
+
+    # Checks the piece that just landed, True if it took too many presses, None if it isn't checked:
+    # soft drop followed by a move or a turn is a tuck or a spin, which the tables don't cover
+    def land(self, shape, rotation, x, piece):
+        inputs = [action for number, action in self.inputs if number == piece]
+        self.inputs = [(number, action) for number, action in self.inputs if number > piece]
+        if "down" in inputs:
+            last_down = len(inputs) - 1 - inputs[::-1].index("down")
+            if any(action in COUNTED for action in inputs[last_down:]):
+                return None
+        moves = self.tables[shape].get(footprint(shape, rotation, x))
+        if moves is None:
+            return None
+
+        presses = sum(1 for action in inputs if action in COUNTED)
+        self.pieces += 1
+        self.last = (presses, moves)
+        if presses > len(moves):
+            self.faults += 1
+            self.extra += presses - len(moves)
+            return True
+        return False
+
+    # One line for the window, e.g. "FINESSE 12/14  3 presses, 2 needed: das_left cw"
+    def report(self):
+        text = f"FINESSE {self.pieces - self.faults}/{self.pieces}"
+        if self.last is not None:
+            presses, moves = self.last
+            if presses > len(moves):
+                text += f"  {presses} presses, {len(moves)} needed: {' '.join(moves) or 'drop'}"
+            else:
+                text += "  OK"
+        return text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the finesse tables and prints the moves for every placement")
+    parser.add_argument("--width", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tables = load_tables(args.width)
+    print(f"{sum(len(table) for table in tables)} placements in {(time.perf_counter() - start) * 1000:.1f}ms")
+    for shape, table in enumerate(tables):
+        print(SHAPE_NAMES[shape])
+        for key, moves in sorted(table.items()):
+            print(f"  columns {min(x for x, y in key)}-{max(x for x, y in key)} {key}: {' '.join(moves) or '-'}")
@@ -0,0 +1,276 @@
+import random
+import time
+
+from board import Board
+from pieces import KICKS, ROTATIONS, SHAPES, SHAPE_NAMES, piece_cells, spawn_at
+from randomizer import PieceQueue, SevenBag
+
+# Color number for bricks in gameover (pieces use shape number + 1) and for the ghost piece
+GAMEOVER_COLOR = 8
+GHOST_COLOR = 9
+
+# Points for 1, 2, 3 and 4 (Tetris!) lines, plus points for every landed piece
+LINE_POINTS = [0, 400, 800, 1200, 2000]
+LAND_POINTS = 50
+START_SPEED = 0.8
+SPEED_FACTOR = 1.5  # Seconds per row are divided by this every level
+MAX_LEVEL = 5
+PREVIEWS = 6  # Upcoming pieces the queue always knows
+GARBAGE_LINES = [0, 0, 1, 2, 4]  # Lines sent to the opponent in versus for 1, 2, 3 and 4 cleared lines
+
+
+# Game rules on top of the board model. Nothing here touches FLTK, the window reads
+# the state back and drains self.events to know which sounds to play and labels to update:
+#   ("move", direction), ("rotate", turn), ("land", (shape_num, rotation, x, spawn)), ("clear", cleared_rows), ("score", None),
+#   ("deal", shape_num), ("spawn", shape_num), ("hold", held_shape_num), ("garbage", lines), ("gameover", None)
+# "deal" is a piece taken from the queue, "spawn" any piece appearing at the top, also one swapped in from hold.
+# The spawn in a "land" event is the number of the landed piece in self.spawns.
+# In versus self.opponent is the other Game, lines sent to it wait in its self.garbage until its piece lands.
+# Rows that need redrawing are collected in self.damage and handed over with pop_damage().
+class Game:
+    def __init__(self, rng=None, start_speed=START_SPEED, speed_factor=SPEED_FACTOR, max_level=MAX_LEVEL,
+                 line_points=LINE_POINTS, land_points=LAND_POINTS, width=10, height=25, hidden=5):
+        self.board = Board(width, height, hidden)
+        self.rng = rng if rng is not None else random
+
+        # Rules, the defaults are the normal game
+        self.start_speed = start_speed
+        self.speed_factor = speed_factor
+        self.max_level = max_level
+        self.line_points = line_points
+        self.land_points = land_points
+        self.opponent = None
+        self.events = []
+        self.damage = None  # (first row, last row + 1) changed since the last pop_damage()
+        self.last_clear = None  # (start, seconds) of the last clear_lines() that cleared something
+        self.reset()
+
+    # Resets the game, a seed makes the pieces come in the same order every time
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self.board.clear()
+        self.events.clear()
+        self.score = 0
+        self.lines = 0
+        self.level = 1
+        self.speed = self.start_speed
+        self.shape = []  # Cells of the falling piece
+        self.ghost = []  # Where the piece would land
+        self.rotation = 0  # Falling piece is ROTATIONS[shape_num][rotation] with its box at (x, y)
+        self.x = 0
+        self.y = 0
+        self.drop = 0  # Rows the piece can still fall
+        self.shape_num = -1
+        self.garbage_rng = random.Random(self.rng.randrange(2 ** 32))  # Hole columns, apart from the pieces
+        self.garbage = []  # Incoming garbage, lines per attack
+        self.queue = PieceQueue(SevenBag(self.rng, len(SHAPES)), PREVIEWS)
+        self.held = -1  # Shape in the hold slot, -1 while it is empty
+        self.can_hold = True  # Once per piece, until it lands
+        self.stats = [0] * len(SHAPES)
+        self.pieces = 0  # Pieces taken from the queue so far
+        self.spawns = 0  # Pieces that appeared at the top, including ones swapped in from hold
+        self.over = False
+        self.touch(0, self.board.height)
+
+    # Color of the piece that is currently falling
+    def color(self):
+        return self.shape_num + 1
+
+    # The piece that comes after the falling one
+    @property
+    def next_shape_num(self):
+        return self.queue.peek(0)
+
+    # Takes the next shape from the queue, if there is no room for it, gameover
+    def new_shape(self):
+        ns = self.queue.pop()
+        self.stats[ns] += 1
+        self.pieces += 1
+        self.events.append(("deal", ns))
+        return self.spawn(ns)
+
+    # Puts a shape at the top of the board
+    def spawn(self, ns):
+        self.shape_num = ns
+        self.spawns += 1
+        rotation, x, y = spawn_at(ns, self.board.width, self.board.hidden)
+        if not self.board.fits_at(ROTATIONS[ns][rotation], x, y):
+            self.shape = piece_cells(ns, rotation, x, y)
+            self.ghost = []
+            self.over = True
+            self.touch(0, self.board.height)
+            self.events.append(("gameover", None))
+            return False
+
+        self.move_piece(rotation, x, y)
+        self.events.append(("spawn", ns))
+        return True
+
+    # Tries to shift the piece, returns True if it moved
+    def try_move(self, dx, dy):
+        if self.over or not self.board.fits_at(ROTATIONS[self.shape_num][self.rotation], self.x + dx, self.y + dy):
+            return False
+        self.move_piece(self.rotation, self.x + dx, self.y + dy)
+        return True
+
+    # Puts the falling piece somewhere else, its ghost comes from the board skyline
+    def move_piece(self, rotation, x, y):
+        self.touch_cells(self.shape)
+        self.touch_cells(self.ghost)
+        self.rotation = rotation
+        self.x = x
+        self.y = y
+        self.shape = piece_cells(self.shape_num, rotation, x, y)
+        self.drop = self.board.drop_distance(self.shape)
+        self.ghost = [(cx, cy + self.drop) for cx, cy in self.shape]
+        self.touch_cells(self.shape)
+        self.touch_cells(self.ghost)
+
+    # Move the block down, by gravity it lands when blocked, by player control (to speed up) it only stops
+    def move_down(self, key=False):
+        if self.try_move(0, 1):
+            return True
+        if not key and not self.over:
+            self.land()
+        return False
+
+    # Player left input
+    def move_left(self):
+        if not self.try_move(-1, 0):
+            return False
+        self.events.append(("move", -1))
+        return True
+
+    # Player right input
+    def move_right(self):
+        if not self.try_move(1, 0):
+            return False
+        self.events.append(("move", 1))
+        return True
+
+    # Rotation of current piece, a table lookup plus at most 5 wall kick tries
+    def rotate(self, dir="clockwise"):
+        if self.over:
+            return False
+        turn = 1 if dir == "clockwise" else -1
+        rotation = (self.rotation + turn) % 4
+        cells = ROTATIONS[self.shape_num][rotation]
+        for dx, dy in KICKS[self.shape_num][self.rotation][turn]:
+            if self.board.fits_at(cells, self.x + dx, self.y + dy):
+                self.move_piece(rotation, self.x + dx, self.y + dy)
+                self.events.append(("rotate", turn))
+                return True
+        return False
+
+    # Swaps the falling piece with the one in the hold slot (or the next piece the first time)
+    def hold(self):
+        if self.over or not self.can_hold:
+            return False
+        held = self.held
+        self.held = self.shape_num
+        self.can_hold = False
+        self.events.append(("hold", self.held))
+        if held == -1:
+            self.new_shape()
+        else:
+            self.spawn(held)
+        return True
+
+    # Instantly drops piece to the lowest position, which the ghost already knows
+    def insta_down(self):
+        if self.over:
+            return
+        self.move_piece(self.rotation, self.x, self.y + self.drop)
+        self.land()
+
+    # Lock the piece into the board, clear lines and spawn the next piece
+    def land(self):
+        self.board.place(self.shape, self.color())
+        self.events.append(("land", (self.shape_num, self.rotation, self.x, self.spawns)))
+        self.clear_lines()
+        self.add_points(self.land_points, 0)
+        self.can_hold = True
+        self.rise()
+        self.new_shape()
+
+    # Clear full lines and move everything above down, all in one pass over the board
+    def clear_lines(self):
+        start = time.perf_counter()
+        cleared_lines = self.board.clear_full_rows()
+        if not cleared_lines:
+            return 0
+        self.last_clear = (start, time.perf_counter() - start)
+
+        # Everything above the lowest cleared line moved
+        self.touch(0, cleared_lines[-1] + 1)
+        self.events.append(("clear", cleared_lines))
+        if self.opponent is not None and GARBAGE_LINES[len(cleared_lines)]:
+            self.opponent.garbage.append(GARBAGE_LINES[len(cleared_lines)])
+        self.add_points(self.line_points[len(cleared_lines)], len(cleared_lines))
+        return len(cleared_lines)
+
+    # Pending garbage comes up from the bottom, every attack with its own hole
+    def rise(self):
+        if not self.garbage:
+            return
+        for lines in self.garbage:
+            self.board.add_garbage(lines, self.garbage_rng.randrange(self.board.width), GAMEOVER_COLOR)
+            self.events.append(("garbage", lines))
+        self.garbage = []
+        self.touch(0, self.board.height)
+
+    # Score, lines, and level calculation
+    def add_points(self, points, lines):
+        self.lines += lines
+        self.score += points
+        self.events.append(("score", None))
+
+        if self.level == self.max_level:
+            return
+        if self.level != self.lines // 10 + 1:  # Increase speed every 10 lines or 1 level up to 5 times
+            self.speed = self.speed / self.speed_factor
+        self.level = self.lines // 10 + 1
+
+    # Colors of the rows top to bottom - 1 as they should be shown, including the falling piece
+    def view(self, top=0, bottom=None):
+        board = self.board
+        if bottom is None:
+            bottom = board.height
+        if self.over:
+            return bytearray([GAMEOVER_COLOR]) * ((bottom - top) * board.width)
+        view = board.colors[top * board.width:bottom * board.width]
+        for x, y in self.ghost:
+            if top <= y < bottom:
+                view[(y - top) * board.width + x] = GHOST_COLOR
+        for x, y in self.shape:
+            if top <= y < bottom:
+                view[(y - top) * board.width + x] = self.color()
+        return view
+
+    # Marks the rows top to bottom - 1 as changed
+    def touch(self, top, bottom):
+        if self.damage is None:
+            self.damage = (top, bottom)
+        else:
+            self.damage = (min(self.damage[0], top), max(self.damage[1], bottom))
+
+    # Marks the rows a piece covers as changed
+    def touch_cells(self, cells):
+        if not cells:
+            return
+        top = min(y for x, y in cells)
+        bottom = max(y for x, y in cells) + 1
+        self.touch(max(top, 0), max(bottom, 0))
+
+    # Hands the changed rows to the caller, None if nothing changed
+    def pop_damage(self):
+        damage = self.damage
+        self.damage = None
+        return damage
+
+    # Hands the pending events to the caller
+    def pop_events(self):
+        events = self.events
+        self.events = []
+        return events
@@ -0,0 +1,166 @@
+import time
+
+FRAME = 1 / 60  # Seconds per logic frame
+MAX_CATCH_UP = 10  # Most frames simulated in one advance(), after a long stall the rest are skipped
+
+# Actions the loop understands, the window maps keys onto these
+ACTIONS = ["left", "right", "down", "drop", "cw", "ccw", "hold"]
+
+
+# Fixed timestep loop driving a Game from time.monotonic(). Every frame is FRAME seconds of
+# game time no matter when it actually runs, so gravity, auto shift (DAS/ARR) and lock delay
+# stay the same on a loaded machine. Frames that had to be caught up are counted in self.missed.
+class GameLoop:
+    def __init__(self, game, das=0.167, arr=0.033, lock_delay=0.5, soft_drop=0.05, max_lock_resets=15,
+                 clock=time.monotonic):
+        self.game = game
+        self.das = das  # Seconds a side key is held before it starts repeating
+        self.arr = arr  # Seconds between repeats after that, 0 moves straight to the wall
+        self.lock_delay = lock_delay  # Seconds a piece can rest on the stack before it locks
+        self.soft_drop = soft_drop  # Seconds per row while down is held
+        self.max_lock_resets = max_lock_resets  # Moves that can restart the lock delay of one piece
+        self.clock = clock
+        self.recorder = None  # Gets every accepted press and release, see replay.py
+        self.player = None  # Computer player whose step() runs at the start of every frame, see autoplay.py
+        self.counters = None  # Gets every accepted press and every frame played, see counters.py
+        self.trainer = None  # Gets every press with the piece it was played on, see finesse.py
+        self.reset()
+
+    def reset(self):
+        self.frame = 0
+        self.missed = 0
+        self.last = None
+        self.lag = 0.0
+        self.held = {}  # action -> seconds it has been held
+        self.pressed = []  # Actions pressed since the last frame
+        self.gravity_time = 0.0
+        self.lock_time = 0.0
+        self.lock_resets = 0
+        self.piece = self.game.spawns
+
+    # Key went down, repeated presses while held (OS key repeat) are ignored
+    def press(self, action):
+        if action in self.held:
+            return
+        self.held[action] = 0.0
+        self.pressed.append(action)
+        if self.recorder is not None:
+            self.recorder.record(self.frame, action)
+        if self.counters is not None:
+            self.counters.input()
+
+    def release(self, action):
+        if self.held.pop(action, None) is not None and self.recorder is not None:
+            self.recorder.record(self.frame, action, True)
+
+    # Runs every frame that is due since the last call, returns how many ran
+    def advance(self, now=None):
+        now = self.clock() if now is None else now
+        if self.last is None:
+            self.last = now
+            return 0
+
+        self.lag += now - self.last
+        self.last = now
+        frames = int(self.lag / FRAME)
+        self.lag -= frames * FRAME
+        if frames > 1:
+            self.missed += frames - 1
+
+        for _ in range(min(frames, MAX_CATCH_UP)):
+            self.step()
+        return frames
+
+    # One frame of game time
+    def step(self):
+        game = self.game
+        if self.player is not None:
+            self.player.step()
+        self.frame += 1
+        if game.over:
+            self.pressed = []
+            return
+        if self.counters is not None:
+            self.counters.frame()
+
+        self.new_piece()
+        pressed = self.pressed
+        self.pressed = []
+        for action in pressed:
+            if self.trainer is not None:  # Played on the piece that is out right now, not when the key went down
+                self.trainer.press(action, game.spawns)
+            self.act(action)
+        self.new_piece()
+
+        # Auto shift for held side keys
+        for action in ("left", "right"):
+            if action in self.held:
+                held = self.held[action]
+                self.held[action] = held + FRAME
+                for _ in range(self.shifts(held + FRAME) - self.shifts(held)):
+                    if not self.act(action):
+                        break
+
+        # Gravity
+        interval = game.speed
+        if "down" in self.held:
+            interval = min(interval, self.soft_drop)
+        self.gravity_time += FRAME
+        while self.gravity_time >= interval:
+            self.gravity_time -= interval
+            if not game.move_down(True):
+                self.gravity_time = 0.0
+                break
+
+        # Lock delay, only counts while the piece rests on something
+        if game.drop == 0:
+            self.lock_time += FRAME
+            if self.lock_time >= self.lock_delay:
+                game.land()
+                self.new_piece()
+        else:
+            self.lock_time = 0.0
+
+    # Auto shift moves due after a side key has been held for some seconds
+    def shifts(self, held):
+        if held < self.das:
+            return 0
+        if self.arr == 0:
+            return self.game.board.width
+        return int((held - self.das) / self.arr) + 1
+
+    # Starts the timers over when a new piece spawned
+    def new_piece(self):
+        if self.game.spawns != self.piece:
+            self.piece = self.game.spawns
+            self.gravity_time = 0.0
+            self.lock_time = 0.0
+            self.lock_resets = 0
+
+    # Does one action, returns True if the piece moved
+    def act(self, action):
+        game = self.game
+        if action == "left":
+            moved = game.move_left()
+        elif action == "right":
+            moved = game.move_right()
+        elif action == "cw":
+            moved = game.rotate("clockwise")
+        elif action == "ccw":
+            moved = game.rotate("counterclockwise")
+        elif action == "down":
+            self.gravity_time = 0.0
+            return game.move_down(True)
+        elif action == "drop":
+            game.insta_down()
+            return True
+        elif action == "hold":
+            return game.hold()
+        else:
+            return False
+
+        # Moving a resting piece gives it a little more time, but not forever
+        if moved and self.lock_time > 0 and self.lock_resets < self.max_lock_resets:
+            self.lock_time = 0.0
+            self.lock_resets += 1
+        return moved
@@ -0,0 +1,92 @@
+# Every shape in all 4 rotation states plus the SRS wall kicks, all worked out once at import.
+# Rotation states follow SRS: 0 = spawn state, 1 = R (clockwise), 2 = upside down, 3 = L.
+# Cells are (x, y) inside the bounding box of the shape, y grows downwards like on the board.
+
+SHAPE_NAMES = ["T_shape", "S_shape", "Z_shape", "J_shape", "L_shape", "I_shape", "O_shape"]
+
+# State 0 of every shape and the size of its bounding box
+STATE0 = [
+    ([(1, 0), (0, 1), (1, 1), (2, 1)], 3),  # T
+    ([(1, 0), (2, 0), (0, 1), (1, 1)], 3),  # S
+    ([(0, 0), (1, 0), (1, 1), (2, 1)], 3),  # Z
+    ([(0, 0), (0, 1), (1, 1), (2, 1)], 3),  # J
+    ([(2, 0), (0, 1), (1, 1), (2, 1)], 3),  # L
+    ([(0, 1), (1, 1), (2, 1), (3, 1)], 4),  # I
+    ([(0, 0), (1, 0), (0, 1), (1, 1)], 2),  # O
+]
+
+# (rotation, x, y) every shape spawns at on the standard 10 wide board with 5 hidden rows, see spawn_at()
+# for other sizes. T, J and L spawn flat side up like they always have
+SPAWNS = [(2, 4, 4), (0, 4, 5), (0, 4, 5), (2, 4, 4), (2, 4, 4), (0, 3, 4), (0, 4, 5)]
+
+# SRS kick offsets for (from state, to state), written with y going up like the guideline tables
+JLSTZ_KICKS = {
+    (0, 1): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
+    (1, 0): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
+    (1, 2): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
+    (2, 1): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
+    (2, 3): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
+    (3, 2): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+    (3, 0): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+    (0, 3): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
+}
+I_KICKS = {
+    (0, 1): [(0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)],
+    (1, 0): [(0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)],
+    (1, 2): [(0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)],
+    (2, 1): [(0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)],
+    (2, 3): [(0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)],
+    (3, 2): [(0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)],
+    (3, 0): [(0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)],
+    (0, 3): [(0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)],
+}
+
+
+# Rotates cells a quarter turn clockwise inside a size x size box
+def rotate_cw(cells, size):
+    return [(size - 1 - y, x) for x, y in cells]
+
+
+# ROTATIONS[shape][rotation] = the cells of that state
+ROTATIONS = []
+for cells, size in STATE0:
+    states = [tuple(cells)]
+    for r in range(3):
+        states.append(tuple(rotate_cw(states[-1], size)))
+    ROTATIONS.append(tuple(states))
+
+# KICKS[shape][rotation][turn] = offsets to try in order when turning (1 = clockwise, -1 = counterclockwise)
+KICKS = []
+for shape in range(len(STATE0)):
+    table = I_KICKS if SHAPE_NAMES[shape] == "I_shape" else JLSTZ_KICKS
+    states = []
+    for r in range(4):
+        turns = {}
+        for turn in (1, -1):
+            if SHAPE_NAMES[shape] == "O_shape":  # Squares look the same every way, no kicks needed
+                turns[turn] = ((0, 0),)
+            else:
+                turns[turn] = tuple((x, -y) for x, y in table[(r, (r + turn) % 4)])
+        states.append(turns)
+    KICKS.append(tuple(states))
+
+
+# Board cells of a shape in a rotation state with its box at (x, y)
+def piece_cells(shape, rotation, x, y):
+    return [(x + cx, y + cy) for cx, cy in ROTATIONS[shape][rotation]]
+
+
+# (rotation, x, y) a shape spawns at on a board of any width, centered and right below the hidden rows
+def spawn_at(shape, width=10, hidden=5):
+    rotation, x, y = SPAWNS[shape]
+    return rotation, x + (width - 10) // 2, y + hidden - 5
+
+
+# Spawn cells of every shape, also used to draw the next and statistics grids
+SHAPES = [piece_cells(n, *SPAWNS[n]) for n in range(len(SPAWNS))]
+
+
+# Leftmost and rightmost box x where a rotation state still fits between the walls
+def x_range(shape, rotation, width):
+    cells = ROTATIONS[shape][rotation]
+    return -min(x for x, y in cells), width - 1 - max(x for x, y in cells)
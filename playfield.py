@@ -0,0 +1,114 @@
+import time
+
+from fltk import *
+
+from cells import CellGrid
+from game import GHOST_COLOR
+from tiles import MIN_TILE
+
+
+# One widget that draws a whole grid of tiles instead of one Fl_Box per cell.
+# Cells hold color numbers (0 = empty, 1-8 = tiles from the shared TileCache, GHOST_COLOR = outline)
+# and only the cells that changed since the last frame get repainted.
+# Cells smaller than MIN_TILE (a 100 wide board) are flat colors: every row with a changed cell is
+# painted again as one rectangle per run of equal colors, so a full redraw costs rows, not cells.
+class TileGrid(Fl_Widget, CellGrid):
+    def __init__(self, x, y, cols, rows, size, tiles):
+        super(TileGrid, self).__init__(x, y, cols * size, rows * size)
+        CellGrid.__init__(self, cols, rows)
+        self.size = size
+        self.tiles = tiles
+
+        # Draw timing
+        self.draw_time = 0.0  # Seconds spent in the last draw()
+        self.on_draw = None  # Called with (start, seconds) after every draw
+
+    def changed(self):
+        self.damage(FL_DAMAGE_USER1)
+
+    def draw(self):
+        start = time.perf_counter()
+
+        # Full redraw when the window was exposed, otherwise only the dirty cells
+        size = self.size
+        tiles = self.tiles
+        dirty = self.take_dirty(self.damage() & FL_DAMAGE_ALL)
+        if size < MIN_TILE:
+            self.draw_flat(dirty)
+            dirty = ()
+        for i in dirty:
+            x = self.x() + (i % self.cols) * size
+            y = self.y() + (i // self.cols) * size
+            color = self.color_at(i)
+            fl_color(FL_BLACK)
+            fl_rectf(x, y, size, size)
+            if color == GHOST_COLOR:
+                fl_color(FL_DARK3)
+                fl_rect(x + 1, y + 1, size - 2, size - 2)
+            elif color:
+                tiles.get(color, size).draw(x, y)
+
+        self.draw_time = time.perf_counter() - start
+        if self.on_draw is not None:
+            self.on_draw(start, self.draw_time)
+
+    # Repaints the rows of the dirty cells with a rectangle per run of one color
+    def draw_flat(self, dirty):
+        size = self.size
+        cols = self.cols
+        for row in sorted({i // cols for i in dirty}):
+            y = self.y() + row * size
+            first = row * cols
+            x = 0
+            while x < cols:
+                color = self.color_at(first + x)
+                end = x + 1
+                while end < cols and self.color_at(first + end) == color:
+                    end += 1
+                if color == GHOST_COLOR:
+                    fl_color(FL_DARK3)
+                elif color:
+                    fl_color(fl_rgb_color(*self.tiles.flat(color)))
+                else:
+                    fl_color(FL_BLACK)
+                fl_rectf(self.x() + x * size, y, (end - x) * size, size)
+                x = end
+
+
+# Slots that each show one whole piece (the next pieces, the hold slot). Every slot is
+# (x, y, w, h, tile size) inside the widget before scaling, the piece images come prebuilt
+# from the TileCache and only the slots whose piece changed get repainted.
+class PreviewPanel(Fl_Widget):
+    def __init__(self, x, y, w, h, slots, tiles):
+        super(PreviewPanel, self).__init__(x, y, w, h)
+        self.slots = slots
+        self.tiles = tiles
+        self.shapes = [-1] * len(slots)  # -1 = empty slot
+        self.dirty = set()
+        self.scale = 1.0
+
+    # Shows a shape in a slot, nothing is redrawn if it is already there
+    def set(self, slot, shape):
+        if self.shapes[slot] != shape:
+            self.shapes[slot] = shape
+            self.dirty.add(slot)
+            self.damage(FL_DAMAGE_USER1)
+
+    def clear(self):
+        for slot in range(len(self.slots)):
+            self.set(slot, -1)
+
+    def draw(self):
+        slots = range(len(self.slots)) if self.damage() & FL_DAMAGE_ALL else self.dirty
+        self.dirty = set()
+        scale = self.scale
+        for slot in slots:
+            x, y, w, h, size = (round(n * scale) for n in self.slots[slot])
+            x += self.x()
+            y += self.y()
+            fl_color(FL_BLACK)
+            fl_rectf(x, y, w, h)
+            shape = self.shapes[slot]
+            if shape >= 0:
+                image = self.tiles.piece(shape, size)
+                image.draw(x + (w - image.w()) // 2, y + (h - image.h()) // 2)
@@ -0,0 +1,180 @@
+import json
+import os
+import struct
+import sys
+import zlib
+
+# Undo and rewind for practice. A snapshot is the whole game at the moment a piece spawned, packed into
+# one bytes object: a keyframe flag, the board rows that changed since the previous snapshot (a row number
+# and a byte per cell), then the rest of the state. A keyframe holds every row that isn't empty instead,
+# and one is taken once the changed rows since the last one add up to its size. So restoring any
+# snapshot reads at most about two boards worth of rows, no matter how far back it is, and the history
+# costs at most twice the rows that actually changed. A placed piece touches a few rows, so a
+# snapshot is a couple of hundred bytes.
+ROW = struct.Struct("<H")
+
+# The state after the rows: this header, the piece counts (4 bytes each), then the queue, the rest
+# of the bag and the pending garbage, each as a length byte and one byte per entry
+STATE = struct.Struct("<bbBBhhIIBdIIB")
+FORMAT = 3  # Suspend file version, 2 added the board size, 3 packed snapshots
+
+
+# Snapshot of game, rows holds the board rows as of the previous snapshot and is brought up to date
+def take(game, rows, keyframe=False):
+    board = game.board
+    w = board.width
+    changed = []
+    for y in range(board.height):
+        row = bytes(board.colors[y * w:(y + 1) * w])
+        if (row.count(0) != w) if keyframe else (row != rows[y]):
+            changed.append(ROW.pack(y) + row)
+        rows[y] = row
+
+    queue = game.queue
+    snapshot = bytearray([keyframe])
+    snapshot += ROW.pack(len(changed))
+    snapshot += b"".join(changed)
+    snapshot += STATE.pack(game.shape_num, game.held, game.can_hold, game.rotation, game.x, game.y, game.score,
+                           game.lines, game.level, game.speed, game.pieces, game.spawns, queue.head)
+    snapshot += struct.pack(f"<{len(game.stats)}I", *game.stats)
+    for values in (queue.slots, queue.draw.bag, game.garbage):
+        snapshot.append(len(values))
+        snapshot += bytes(values)
+    return bytes(snapshot)
+
+
+# Bytes of rows in a snapshot
+def rows_size(snapshot, width):
+    return ROW.unpack_from(snapshot, 1)[0] * (ROW.size + width)
+
+
+# Index of the keyframe history[index] builds on
+def keyframe_of(history, index):
+    while not history[index][0]:
+        index -= 1
+    return index
+
+
+# Changed rows of a snapshot as (y, colors), and where its state starts
+def read_rows(snapshot, width):
+    count = ROW.unpack_from(snapshot, 1)[0]
+    pos = 1 + ROW.size
+    rows = []
+    for _ in range(count):
+        rows.append((ROW.unpack_from(snapshot, pos)[0], snapshot[pos + ROW.size:pos + ROW.size + width]))
+        pos += ROW.size + width
+    return rows, pos
+
+
+# Puts the game back exactly as it was at history[index]
+def restore(game, history, index):
+    board = game.board
+    w = board.width
+    colors = bytearray(w * board.height)
+    for snapshot in history[keyframe_of(history, index):index + 1]:
+        rows, pos = read_rows(snapshot, w)
+        for y, row in rows:
+            colors[y * w:(y + 1) * w] = row
+    board.colors[:] = colors
+    for y in range(board.height):
+        mask = 0
+        for x in range(w):
+            if colors[y * w + x]:
+                mask |= 1 << x
+        board.rows[y] = mask
+    board.update_tops()
+
+    queue = game.queue
+    state = history[index]
+    (game.shape_num, game.held, can_hold, rotation, x, y, game.score, game.lines, game.level, game.speed,
+     game.pieces, game.spawns, queue.head) = STATE.unpack_from(state, pos)
+    game.can_hold = bool(can_hold)
+    pos += STATE.size
+    game.stats = list(struct.unpack_from(f"<{len(game.stats)}I", state, pos))
+    pos += len(game.stats) * 4
+    lists = []
+    for _ in range(3):
+        size = state[pos]
+        lists.append(list(state[pos + 1:pos + 1 + size]))
+        pos += 1 + size
+    queue.slots, queue.draw.bag, game.garbage = lists
+    game.over = False
+    game.events.clear()
+    game.shape = []
+    game.ghost = []
+    game.move_piece(rotation, x, y)
+    game.touch(0, board.height)
+
+
+# Every spawn of a practice game, undo() goes back one piece at a time, rewind() to any of them
+class Practice:
+    def __init__(self):
+        self.clear()
+
+    # New game, nothing to take back
+    def clear(self):
+        self.history = []
+        self.rows = None  # Board rows as of the last snapshot
+        self.keyframe_size = 0  # Row bytes in the last keyframe
+        self.changed_size = 0  # Row bytes in the snapshots after it
+
+    # Call when a piece spawned
+    def record(self, game):
+        if self.rows is None:
+            self.rows = [None] * game.board.height
+        keyframe = not self.history or self.changed_size >= self.keyframe_size
+        snapshot = take(game, self.rows, keyframe)
+        self.history.append(snapshot)
+        if keyframe:
+            self.keyframe_size = rows_size(snapshot, game.board.width)
+            self.changed_size = 0
+        else:
+            self.changed_size += rows_size(snapshot, game.board.width)
+
+    # Takes back the last steps pieces, False if there is nothing to go back to. After gameover the
+    # last snapshot is the spawn of the last piece that was placed, so it is the first step back
+    def undo(self, game, steps=1):
+        if not self.history:
+            return False
+        last = len(self.history) if game.over else len(self.history) - 1
+        return self.rewind(game, max(last - steps, 0))
+
+    # Back to the spawn of piece number index, everything after it is forgotten
+    def rewind(self, game, index):
+        del self.history[index + 1:]
+        restore(game, self.history, index)
+        board = game.board
+        self.rows = [bytes(board.colors[y * board.width:(y + 1) * board.width]) for y in range(board.height)]
+        keyframe = keyframe_of(self.history, index)
+        self.keyframe_size = rows_size(self.history[keyframe], board.width)
+        self.changed_size = sum(rows_size(snapshot, board.width) for snapshot in self.history[keyframe + 1:])
+        return True
+
+    # Bytes held by the snapshots
+    def size(self):
+        return sys.getsizeof(self.history) + sum(sys.getsizeof(snapshot) for snapshot in self.history)
+
+    # Suspends the game to disk, the history comes along so undo still works after resume()
+    def save(self, path, game):
+        data = {"format": FORMAT, "width": game.board.width, "height": game.board.height,
+                "history": [snapshot.hex() for snapshot in self.history]}
+        with open(path + ".tmp", "wb") as file:
+            file.write(zlib.compress(json.dumps(data).encode(), 9))
+        os.replace(path + ".tmp", path)
+
+    # Loads a suspended game and puts it into game, raises ValueError for a bad file
+    def resume(self, path, game):
+        with open(path, "rb") as file:
+            try:
+                data = json.loads(zlib.decompress(file.read()))
+            except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as error:
+                raise ValueError(f"Damaged practice file {path}") from error
+        if data.get("format") != FORMAT or not data.get("history"):
+            raise ValueError(f"Unsupported practice file {path}")
+        board = game.board
+        if (data.get("width"), data.get("height")) != (board.width, board.height):
+            raise ValueError(f"Practice file {path} is for a {data.get('width')}x{data.get('height')} board, "
+                             f"not {board.width}x{board.height}")
+
+        self.history = [bytes.fromhex(snapshot) for snapshot in data["history"]]
+        self.rewind(game, len(self.history) - 1)
@@ -0,0 +1,170 @@
+import collections
+import json
+import math
+import time
+
+# Phases of a frame that get their own timer, line_clear is the part of logic that clears lines
+PHASES = ["input", "logic", "render", "audio", "line_clear"]
+
+
+# Log-scale histogram of durations in seconds. Buckets grow by 25% starting at 10 microseconds,
+# so anything from a key press to a stalled frame fits in 64 counters.
+class Histogram:
+    def __init__(self, low=1e-5, growth=1.25, buckets=64):
+        self.low = low
+        self.growth = growth
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds <= self.low:
+            i = 0
+        else:
+            i = min(int(math.log(seconds / self.low) / math.log(self.growth)) + 1, len(self.counts) - 1)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # Upper bound of the bucket holding the p-th percentile
+    def percentile(self, p):
+        if self.count == 0:
+            return 0.0
+        wanted = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= wanted:
+                return min(self.low * self.growth ** i, self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    # Milliseconds, rounded for printing
+    def summary(self):
+        return {"count": self.count, "mean_ms": round(self.mean() * 1000, 3),
+                "p50_ms": round(self.percentile(50) * 1000, 3), "p90_ms": round(self.percentile(90) * 1000, 3),
+                "p99_ms": round(self.percentile(99) * 1000, 3), "max_ms": round(self.max * 1000, 3)}
+
+
+# Per-phase timers, frame times and input-to-draw latency, plus a trace of the session
+# that can be dumped in Chrome trace format (chrome://tracing, Perfetto).
+class Profiler:
+    enabled = True
+
+    def __init__(self, trace_size=100000, overlay=True):
+        self.overlay = overlay  # FPS on screen, off when only telemetry wants the numbers
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.frame_times = Histogram()
+        self.input_latency = Histogram()
+        self.trace = collections.deque(maxlen=trace_size)  # (phase, start, seconds)
+        self.started = time.perf_counter()
+        self.last_frame = None
+        self.inputs = []  # (time, frame) of key presses still waiting to be played and drawn
+        self.sources = {}  # name -> function returning more numbers for the summary
+
+    def begin(self):
+        return time.perf_counter()
+
+    def end(self, phase, start):
+        self.add(phase, start, time.perf_counter() - start)
+
+    def add(self, phase, start, seconds):
+        self.phases[phase].add(seconds)
+        self.trace.append((phase, start, seconds))
+
+    # Called once per frame
+    def frame(self):
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.frame_times.add(now - self.last_frame)
+        self.last_frame = now
+
+    # A key was pressed now, the game loop plays it in the step that starts at loop frame frame
+    # (the next one, or a few later in versus)
+    def input(self, frame):
+        self.inputs.append((time.perf_counter(), frame))
+
+    # The changes of the loop frames before frame were drawn, every key press they played is done
+    def drawn(self, frame):
+        now = time.perf_counter()
+        for pressed, played in self.inputs:
+            if played < frame:
+                self.input_latency.add(now - pressed)
+        self.inputs = [(pressed, played) for pressed, played in self.inputs if played >= frame]
+
+    # The key presses that were played without changing anything on screen have nothing to measure.
+    # Presses that haven't been played yet are kept
+    def drop_inputs(self, frame):
+        self.inputs = [(pressed, played) for pressed, played in self.inputs if played >= frame]
+
+    # Adds what source() returns to every summary under name
+    def watch(self, name, source):
+        self.sources[name] = source
+
+    def fps(self):
+        mean = self.frame_times.mean()
+        return 1 / mean if mean else 0.0
+
+    def summary(self):
+        return {"seconds": round(time.perf_counter() - self.started, 3), "fps": round(self.fps(), 1),
+                "frame_time": self.frame_times.summary(), "input_latency": self.input_latency.summary(),
+                "phases": {phase: hist.summary() for phase, hist in self.phases.items()},
+                **{name: source() for name, source in self.sources.items()}}
+
+    # Writes the summary and the trace to a JSON file
+    def dump(self, path):
+        events = [{"name": phase, "ph": "X", "pid": 0, "tid": 0, "ts": round((start - self.started) * 1e6, 1),
+                   "dur": round(seconds * 1e6, 1)} for phase, start, seconds in self.trace]
+        with open(path, "w") as file:
+            json.dump({"summary": self.summary(), "traceEvents": events}, file)
+
+
+# Splits startup into named phases, every mark() ends the phase that was running
+class PhaseTimer:
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.perf_counter()
+        self.last = self.start
+        self.phases = []  # (name, seconds)
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        phases = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases)
+        return f"Startup {(self.last - self.start) * 1000:.1f}ms: {phases}"
+
+
+# Stand-in used when profiling is off, every call does nothing
+class NullProfiler:
+    enabled = False
+    overlay = False
+
+    def begin(self):
+        return 0.0
+
+    def end(self, phase, start):
+        pass
+
+    def add(self, phase, start, seconds):
+        pass
+
+    def frame(self):
+        pass
+
+    def input(self, frame):
+        pass
+
+    def drawn(self, frame):
+        pass
+
+    def drop_inputs(self, frame):
+        pass
+
+    def watch(self, name, source):
+        pass
@@ -0,0 +1,38 @@
+# Where the pieces come from. SevenBag deals every shape once per bag of 7 in a shuffled order,
+# so a shape never stays away for more than 12 pieces. PieceQueue keeps the upcoming pieces
+# in a fixed ring of slots, popping the front refills that same slot from the back.
+class SevenBag:
+    def __init__(self, rng, shapes=7):
+        self.rng = rng
+        self.shapes = shapes
+        self.bag = []
+
+    def __call__(self):
+        if not self.bag:
+            self.bag = list(range(self.shapes))
+            self.rng.shuffle(self.bag)
+        return self.bag.pop()
+
+
+class PieceQueue:
+    def __init__(self, draw, size=6):
+        self.draw = draw  # Called for every new piece
+        self.slots = [draw() for _ in range(size)]
+        self.head = 0  # Slot of the next piece
+
+    def __len__(self):
+        return len(self.slots)
+
+    # Shape that comes i pieces after the next one
+    def peek(self, i=0):
+        return self.slots[(self.head + i) % len(self.slots)]
+
+    # The next n shapes in order
+    def upcoming(self, n):
+        return [self.peek(i) for i in range(min(n, len(self.slots)))]
+
+    def pop(self):
+        shape = self.slots[self.head]
+        self.slots[self.head] = self.draw()
+        self.head = (self.head + 1) % len(self.slots)
+        return shape
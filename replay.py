@@ -0,0 +1,160 @@
+import argparse
+import struct
+import time
+import zlib
+
+from game import Game
+from loop import ACTIONS, GameLoop
+
+# Replay file: magic, version, seed, board width and height (hidden rows included), then a zlib
+# compressed stream of (frame delta varint, code byte) events where code = action number * 2 + 1 if
+# released. The END code is followed by the final frame delta and the score, lines and pieces the game
+# finished with, so a replay can be audited.
+# Version 2 games deal their pieces from 7-bags, so version 1 replays no longer play back the same.
+# Version 3 added the board size.
+MAGIC = b"TTRP"
+VERSION = 3
+HEADER = struct.Struct("<4sBIHH")
+END = 0xFF
+
+
+def write_varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(data, pos):
+    n = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+# Records the inputs of one game, GameLoop calls record() for every press and release
+class Recorder:
+    def __init__(self, seed):
+        self.seed = seed
+        self.events = bytearray()
+        self.last_frame = 0
+
+    def record(self, frame, action, release=False):
+        write_varint(self.events, frame - self.last_frame)
+        self.last_frame = frame
+        self.events.append(ACTIONS.index(action) * 2 + release)
+
+    # The finished replay as bytes
+    def finish(self, frame, game):
+        body = bytearray(self.events)
+        write_varint(body, frame - self.last_frame)
+        body.append(END)
+        for n in (game.score, game.lines, game.pieces):
+            write_varint(body, n)
+        header = HEADER.pack(MAGIC, VERSION, self.seed, game.board.width, game.board.height)
+        return header + zlib.compress(bytes(body), 9)
+
+    def save(self, path, frame, game):
+        with open(path, "wb") as file:
+            file.write(self.finish(frame, game))
+
+
+# Splits a replay into (seed, (width, height), [(frame, action, release)], end frame, (score, lines, pieces))
+def parse(data):
+    if len(data) < HEADER.size:
+        raise ValueError("Replay is too short")
+    magic, version, seed, width, height = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a replay file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported replay version {version}")
+
+    try:
+        body = zlib.decompress(data[HEADER.size:])
+        events = []
+        frame = 0
+        pos = 0
+        while True:
+            delta, pos = read_varint(body, pos)
+            frame += delta
+            code = body[pos]
+            pos += 1
+            if code == END:
+                break
+            events.append((frame, ACTIONS[code // 2], code % 2 == 1))
+        result = []
+        for _ in range(3):
+            n, pos = read_varint(body, pos)
+            result.append(n)
+    except (zlib.error, IndexError) as error:
+        raise ValueError("Replay is corrupt") from error
+    return seed, (width, height), events, frame, tuple(result)
+
+
+# Plays a replay back by feeding the recorded inputs to a GameLoop frame by frame.
+# Headless it runs as fast as Python allows, the window can call advance() with N frames per tick instead.
+# A game that is passed in must have the board size of the replay, otherwise ValueError
+class ReplayPlayer:
+    def __init__(self, data, game=None, loop=None):
+        self.seed, self.size, self.events, self.end_frame, self.result = parse(data)
+        width, height = self.size
+        if game is None:
+            game = Game(width=width, height=height)
+        elif (game.board.width, game.board.height) != self.size:
+            raise ValueError(f"Replay is for a {width}x{height} board, "
+                             f"not {game.board.width}x{game.board.height}")
+        self.game = game
+        self.loop = loop if loop is not None else GameLoop(self.game)
+        self.game.reset(self.seed)
+        self.loop.reset()
+        self.game.new_shape()
+        self.next = 0
+
+    def done(self):
+        return self.game.over or self.loop.frame >= self.end_frame
+
+    # Runs up to frames frames, returns False once the replay is over
+    def advance(self, frames):
+        loop = self.loop
+        events = self.events
+        for _ in range(frames):
+            if self.done():
+                return False
+            while self.next < len(events) and events[self.next][0] == loop.frame:
+                frame, action, release = events[self.next]
+                if release:
+                    loop.release(action)
+                else:
+                    loop.press(action)
+                self.next += 1
+            loop.step()
+        return not self.done()
+
+    # Plays the whole thing, True if it ends with the recorded score, lines and pieces
+    def run(self):
+        self.advance(self.end_frame - self.loop.frame)
+        return (self.game.score, self.game.lines, self.game.pieces) == self.result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-simulates a replay headlessly and checks its result")
+    parser.add_argument("replay")
+    args = parser.parse_args()
+
+    with open(args.replay, "rb") as file:
+        data = file.read()
+    start = time.perf_counter()
+    player = ReplayPlayer(data)
+    ok = player.run()
+    seconds = time.perf_counter() - start
+
+    game = player.game
+    print(f"{'OK' if ok else 'MISMATCH'}: score {game.score}, lines {game.lines}, pieces {game.pieces}, "
+          f"{player.loop.frame} frames in {seconds:.3f}s ({len(data)} bytes)")
+    if not ok:
+        print(f"Recorded: score {player.result[0]}, lines {player.result[1]}, pieces {player.result[2]}")
@@ -0,0 +1,317 @@
+import argparse
+import bisect
+import heapq
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+# Every finished game is one Score. The journal (scores.log) gets a text line per game, appended from a
+# background thread and fsynced once per batch, every line ends with a crc32 so a torn or damaged line is
+# skipped on load. Compaction folds the journal into the snapshot (scores.dat): a fixed size binary record
+# per game sorted by score, written to a temp file and swapped in with os.replace. The snapshot header
+# keeps the last sequence number it holds, so journal lines from before a compaction that crashed before
+# truncating the journal are not counted twice.
+Score = namedtuple("Score", "seq score lines level day time player")
+
+MAGIC = b"TTSC"
+VERSION = 1
+HEADER = struct.Struct("<4sBQIIII")  # magic, version, last seq, records, best score, names, body crc32
+RECORD = struct.Struct("<QIIBIdI")  # seq, score, lines, level, day, time, player name number
+COMPACT_EVERY = 1000  # Journal lines before the writer folds them into the snapshot, keeps startup short
+
+
+def today(t=None):
+    return int(time.strftime("%Y%m%d", time.localtime(t)))
+
+
+def sort_key(score):
+    return -score.score, score.seq
+
+
+def format_line(score):
+    player = score.player.replace("\t", " ").replace("\n", " ")
+    line = f"{score.seq}\t{score.score}\t{score.lines}\t{score.level}\t{score.day}\t{score.time:.3f}\t{player}"
+    return f"{line}\t{zlib.crc32(line.encode()):08x}\n"
+
+
+# A journal line back into a Score, None if it is torn or damaged
+def parse_line(line):
+    line, sep, crc = line.rstrip("\n").rpartition("\t")
+    if not sep:
+        return None
+    try:
+        if int(crc, 16) != zlib.crc32(line.encode()):
+            return None
+        seq, score, lines, level, day, t, player = line.split("\t")
+        return Score(int(seq), int(score), int(lines), int(level), int(day), float(t), player)
+    except ValueError:
+        return None
+
+
+# Top N queries by day, level and player. Every list is kept sorted best first
+class ScoreIndex:
+    def __init__(self):
+        self.all = []
+        self.by_day = {}
+        self.by_level = {}
+        self.by_player = {}
+
+    def add(self, score, in_order=False):
+        for index, key in ((self.by_day, score.day), (self.by_level, score.level), (self.by_player, score.player)):
+            scores = index.get(key)
+            if scores is None:
+                scores = index[key] = []
+            if in_order:
+                scores.append(score)
+            else:
+                bisect.insort(scores, score, key=sort_key)
+        if in_order:
+            self.all.append(score)
+        else:
+            bisect.insort(self.all, score, key=sort_key)
+
+    def top(self, n=10, day=None, level=None, player=None):
+        # Start from the smallest list that matches, the other filters are checked per score
+        filters = [(index, key) for index, key in
+                   ((self.by_day, day), (self.by_level, level), (self.by_player, player)) if key is not None]
+        scores = self.all
+        for index, key in filters:
+            matching = index.get(key, [])
+            if len(matching) < len(scores):
+                scores = matching
+        best = []
+        for score in scores:
+            if ((day is None or score.day == day) and (level is None or score.level == level)
+                    and (player is None or score.player == player)):
+                best.append(score)
+                if len(best) == n:
+                    break
+        return best
+
+
+class ScoreJournal:
+    def __init__(self, folder=".", compact_every=COMPACT_EVERY, batch_delay=0.05, migrate="highscore.txt"):
+        self.journal_path = os.path.join(folder, "scores.log")
+        self.snapshot_path = os.path.join(folder, "scores.dat")
+        self.compact_every = compact_every
+        self.batch_delay = batch_delay  # Seconds the writer waits for more scores before one fsync
+
+        self.lock = threading.Lock()  # Only held for quick updates, add() must never wait on the disk
+        self.load_lock = threading.RLock()  # One load or compaction at a time, add() doesn't take it
+        self.queue = queue.Queue()
+        self.writer = None
+        self.index = None  # Built on the first query
+        self.pending = []  # Scores added before the index was built
+
+        # Startup only reads the snapshot header and the journal, not the whole history
+        self.snapshot_seq, self.snapshot_count, self.best_score = self.read_header()
+        self.seq = self.snapshot_seq
+        self.journal_count = 0
+        self.journal_size = 0  # Bytes up to the end of the last good line, a torn tail is cut off there
+        for score in self.read_journal():
+            self.seq = max(self.seq, score.seq)
+            self.best_score = max(self.best_score, score.score)
+            self.journal_count += 1
+
+        # The old single number highscore becomes the first entry
+        if self.seq == 0 and migrate and os.path.exists(migrate):
+            try:
+                with open(migrate, "r") as file:
+                    self.add(int(file.read()), 0, 0, "")
+            except (OSError, ValueError):
+                print(f"Error. Could not import the old highscore from '{migrate}'")
+
+    def read_header(self):
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                magic, version, seq, count, best, names, crc = HEADER.unpack(file.read(HEADER.size))
+        except (OSError, struct.error):
+            return 0, 0, 0
+        if magic != MAGIC or version != VERSION:
+            print(f"Error. '{self.snapshot_path}' is not a score snapshot, ignoring it")
+            return 0, 0, 0
+        return seq, count, best
+
+    def read_snapshot(self):
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return []
+        try:
+            magic, version, seq, count, best, names, crc = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or zlib.crc32(data[HEADER.size:]) != crc:
+                raise ValueError
+            pos = HEADER.size
+            players = []
+            for _ in range(names):
+                size = data[pos]
+                players.append(data[pos + 1:pos + 1 + size].decode())
+                pos += 1 + size
+            records = RECORD.iter_unpack(data[pos:pos + count * RECORD.size])
+            return [Score(seq, score, lines, level, day, t, players[player])
+                    for seq, score, lines, level, day, t, player in records]
+        except (ValueError, IndexError, struct.error, UnicodeDecodeError):
+            print(f"Error. '{self.snapshot_path}' is damaged, ignoring it")
+            return []
+
+    # Journal lines after the snapshot, damaged lines are skipped
+    def read_journal(self):
+        scores = []
+        try:
+            with open(self.journal_path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return scores
+        pos = 0
+        while pos < len(data):
+            end = data.find(b"\n", pos)
+            if end == -1:  # Torn last line from a crash
+                break
+            try:
+                score = parse_line(data[pos:end].decode())
+            except UnicodeDecodeError:
+                score = None
+            pos = end + 1
+            self.journal_size = pos
+            if score is not None and score.seq > self.snapshot_seq:
+                scores.append(score)
+        return scores
+
+    # Highest score ever, without loading the history
+    def best(self):
+        return self.best_score
+
+    # Saves a finished game, the disk write happens on the writer thread
+    def add(self, score, lines, level, player=""):
+        with self.lock:
+            self.seq += 1
+            now = time.time()
+            entry = Score(self.seq, score, lines, level, today(now), now, player)
+            self.best_score = max(self.best_score, score)
+            if self.index is not None:
+                self.index.add(entry)
+            else:
+                self.pending.append(entry)
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_loop, daemon=True)
+            self.writer.start()
+        self.queue.put(entry)
+        return entry
+
+    # Reads and merges the history without holding self.lock, only the swap at the end takes it
+    def load(self):
+        with self.load_lock:
+            if self.index is not None:
+                return self.index
+            newer = self.read_journal()
+            newer.sort(key=sort_key)
+
+            # The snapshot is already sorted, so everything goes in with one merge
+            index = ScoreIndex()
+            for score in heapq.merge(self.read_snapshot(), newer, key=sort_key):
+                index.add(score, in_order=True)
+
+            seen = max([self.snapshot_seq] + [score.seq for score in newer])
+            with self.lock:
+                for score in self.pending:  # Added since startup, maybe not written yet
+                    if score.seq > seen:
+                        index.add(score)
+                self.pending = []
+                self.index = index
+            return index
+
+    def top(self, n=10, day=None, level=None, player=None):
+        index = self.load()
+        with self.lock:
+            return index.top(n, day, level, player)
+
+    # Writer thread: one write and one fsync for every batch of scores
+    def write_loop(self):
+        with open(self.journal_path, "ab") as file:
+            file.truncate(self.journal_size)
+            running = True
+            while running:
+                batch = [self.queue.get()]
+                deadline = time.monotonic() + self.batch_delay
+                while batch[-1] is not None:
+                    try:
+                        batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    running = False
+                    batch.pop()
+                if batch:
+                    file.write("".join(format_line(score) for score in batch).encode())
+                    file.flush()
+                    os.fsync(file.fileno())
+                    self.journal_count += len(batch)
+                if self.journal_count >= self.compact_every:
+                    with self.load_lock:  # A load can't read the new snapshot and the old journal
+                        self.compact()
+                        file.seek(0)
+                        file.truncate()
+                        os.fsync(file.fileno())
+                    self.journal_count = 0
+
+    # Folds the journal into a new snapshot, the old one stays until the new one is complete
+    def compact(self):
+        index = self.load()
+        with self.lock:
+            scores = list(index.all)
+            seq = self.seq
+
+        players = {}
+        body = bytearray()
+        for score in scores:
+            player = players.setdefault(score.player, len(players))
+            body += RECORD.pack(score.seq, score.score, score.lines, score.level, score.day, score.time, player)
+        names = bytearray()
+        for name in players:
+            encoded = name.encode()[:255].decode(errors="ignore").encode()  # Cut on a character boundary
+            names.append(len(encoded))
+            names += encoded
+        body = names + body
+        best = scores[0].score if scores else 0
+
+        temp = self.snapshot_path + ".tmp"
+        with open(temp, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, seq, len(scores), best, len(players), zlib.crc32(body)))
+            file.write(body)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.snapshot_path)
+        self.snapshot_seq = seq
+
+    # Waits for every score to be on disk
+    def close(self):
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shows the local leaderboard")
+    parser.add_argument("-n", type=int, default=10, help="how many scores")
+    parser.add_argument("--today", action="store_true", help="only games played today")
+    parser.add_argument("--day", type=int, help="only games played on this day (YYYYMMDD)")
+    parser.add_argument("--level", type=int, help="only games that ended on this level")
+    parser.add_argument("--player", help="only games by this player")
+    parser.add_argument("--compact", action="store_true", help="fold the journal into the snapshot first")
+    args = parser.parse_args()
+
+    journal = ScoreJournal()
+    if args.compact:
+        journal.compact()
+        with open(journal.journal_path, "w"):
+            pass
+    day = today() if args.today else args.day
+    for rank, score in enumerate(journal.top(args.n, day, args.level, args.player), 1):
+        played = time.strftime("%Y-%m-%d %H:%M", time.localtime(score.time))
+        print(f"{rank:3d}. {score.score:7d}  level {score.level}  {score.lines:4d} lines  {played}  {score.player}")
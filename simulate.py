@@ -0,0 +1,82 @@
+import argparse
+import csv
+import multiprocessing
+import random
+import sys
+import time
+
+from autoplay import RandomPolicy, ScriptedPlayer
+from bot import Bot
+from game import Game, LAND_POINTS, LINE_POINTS, MAX_LEVEL, SPEED_FACTOR, START_SPEED
+from loop import GameLoop
+from pieces import SHAPE_NAMES
+
+# Players the runner can use, each takes the per-game RNG and returns a policy for ScriptedPlayer
+POLICIES = {
+    "random": RandomPolicy,
+    "bot": lambda rng: Bot(lookahead=False),
+    "bot-lookahead": lambda rng: Bot(lookahead=True),
+}
+
+COLUMNS = ["seed", "score", "lines", "level", "pieces", "frames", "seconds"] + [name[0] for name in SHAPE_NAMES]
+
+
+# Plays one whole headless game, returns its CSV row
+def play_game(job):
+    seed, options = job
+    game = Game(start_speed=options["start_speed"], speed_factor=options["speed_factor"],
+                max_level=options["max_level"], line_points=options["line_points"],
+                land_points=options["land_points"])
+    loop = GameLoop(game)
+    game.reset(seed)
+    loop.reset()
+    game.new_shape()
+    loop.player = ScriptedPlayer(loop, POLICIES[options["policy"]](random.Random(seed)), options["delay"])
+
+    start = time.perf_counter()
+    while not game.over and game.pieces <= options["max_pieces"]:
+        loop.step()
+        game.events.clear()
+    seconds = time.perf_counter() - start
+
+    return [seed, game.score, game.lines, game.level, game.pieces, loop.frame, round(seconds, 4)] + game.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays many headless games in parallel and writes one CSV row per game")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, the others count up from it")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--delay", type=int, default=2, help="frames between two key presses of the player")
+    parser.add_argument("--max-pieces", type=int, default=1000, help="games are cut off after this many pieces")
+    parser.add_argument("--start-speed", type=float, default=START_SPEED, help="seconds per row at level 1")
+    parser.add_argument("--speed-factor", type=float, default=SPEED_FACTOR, help="speed is divided by this every level")
+    parser.add_argument("--max-level", type=int, default=MAX_LEVEL)
+    parser.add_argument("--line-points", default=",".join(str(n) for n in LINE_POINTS[1:]),
+                        help="points for 1, 2, 3 and 4 lines")
+    parser.add_argument("--land-points", type=int, default=LAND_POINTS)
+    parser.add_argument("--output", "-o", help="CSV file, standard output if not given")
+    args = parser.parse_args()
+
+    options = {"policy": args.policy, "delay": args.delay, "max_pieces": args.max_pieces,
+               "start_speed": args.start_speed, "speed_factor": args.speed_factor, "max_level": args.max_level,
+               "line_points": [0] + [int(n) for n in args.line_points.split(",")], "land_points": args.land_points}
+    jobs = [(args.seed + n, options) for n in range(args.games)]
+
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS)
+
+    # Rows are written as soon as each game finishes, in whatever order they finish
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        for row in pool.imap_unordered(play_game, jobs, chunksize=max(1, args.games // (args.workers * 8))):
+            writer.writerow(row)
+    seconds = time.perf_counter() - start
+    if output is not sys.stdout:
+        output.close()
+
+    rate = args.games / seconds
+    print(f"{args.games} games in {seconds:.2f}s: {rate:.1f} games/s, {rate / args.workers:.1f} games/s per core "
+          f"({args.workers} workers)", file=sys.stderr)
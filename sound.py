@@ -0,0 +1,121 @@
+import glob
+import os
+import time
+
+from bundle import SOUND, asset_path, format_name
+
+
+# pygame mixer size for samples width bytes wide, 8 bit WAVs are unsigned and the others signed
+def mixer_size(width):
+    return 8 if width == 1 else -8 * width
+
+
+# Class for song to loop in background, one instance is made and reused for every game
+class Song:
+    def __init__(self, song_path):
+        import vlc  # Only loaded once the first game starts
+
+        self.instance = vlc.Instance()
+        self.player = self.instance.media_player_new()
+        self.media_list = self.instance.media_list_new([asset_path(song_path)])
+        self.media_list_player = self.instance.media_list_player_new()
+        self.media_list_player.set_media_list(self.media_list)
+        self.media_list_player.set_playback_mode(1)
+
+    def loop_sound(self):
+        self.media_list_player.play()
+
+    def stop_sound(self):
+        self.media_list_player.stop()
+
+
+# Sound effects decoded once into memory and played on a fixed pool of mixer channels,
+# so a keypress never touches the disk and a new effect doesn't cut off the previous one.
+# pygame and the sounds are loaded on the first play (or load()), not at startup.
+# With an asset bundle the mixer gets the PCM samples straight from it and no WAV is opened.
+class SoundEffects:
+    def __init__(self, folder="Sounds", channels=8, min_interval=None, bundle=None):
+        self.folder = folder
+        self.bundle = bundle
+        self.channels = channels
+        self.sounds = None  # Effects are named after their file, e.g. "land" for Sounds/land.wav
+        self.mixer = None
+
+        # Minimum seconds between two plays of the same effect (for key repeat)
+        self.min_interval = min_interval if min_interval is not None else {}
+        self.last_played = {}
+
+        # Counters
+        self.played = 0
+        self.limited = 0
+        self.total_latency = 0.0  # Seconds spent between play() being called and the channel starting
+        self.max_latency = 0.0
+        self.on_error = None  # Called with a message when the effects can't be loaded
+
+    def load(self):
+        if self.sounds is not None:
+            return
+        self.sounds = {}
+        try:
+            self.load_sounds()
+        except (ImportError, RuntimeError, OSError, ValueError) as error:  # pygame.error is a RuntimeError
+            self.sounds = {}
+            message = f"Could not load the sound effects ({error}), playing without them"
+            print(f"Error. {message}")
+            if self.on_error is not None:
+                self.on_error(message)
+
+    def load_sounds(self):
+        import pygame
+
+        names = [] if self.bundle is None else [name for name in self.bundle.names(SOUND)
+                                                 if name.startswith(self.folder + "/")]
+        if names:  # The mixer is set up for the samples in the bundle, so they play as they are
+            rate, channels, width, samples = self.bundle.sound(names[0])
+            pygame.mixer.pre_init(rate, mixer_size(width), channels, buffer=512)
+        else:
+            pygame.mixer.pre_init(buffer=512)  # Small buffer for low latency
+        pygame.mixer.init()
+        pygame.mixer.set_num_channels(self.channels)
+        self.mixer = pygame.mixer
+
+        mixer_format = pygame.mixer.get_init()  # (rate, size, channels) the mixer really got
+        for path in names:
+            rate, channels, width, samples = self.bundle.sound(path)
+            if (rate, mixer_size(width), channels) != mixer_format:  # The samples would play as noise
+                raise ValueError(f"'{path}' in the asset bundle is {format_name(rate, channels, width)}, the mixer "
+                                 f"plays {mixer_format[0]} Hz, {mixer_format[2]} channels, "
+                                 f"{abs(mixer_format[1])} bit, rebuild the bundle with python bundle.py")
+            self.sounds[os.path.splitext(os.path.basename(path))[0]] = pygame.mixer.Sound(buffer=samples)
+        if not names:
+            for path in sorted(glob.glob(os.path.join(asset_path(self.folder), "*.wav"))):
+                name = os.path.splitext(os.path.basename(path))[0]
+                self.sounds[name] = pygame.mixer.Sound(path)
+
+    # Plays an effect on a free channel, or on the oldest one if they are all busy
+    def play(self, name):
+        self.load()
+        start = time.perf_counter()
+        last = self.last_played.get(name)
+        if last is not None and start - last < self.min_interval.get(name, 0):
+            self.limited += 1
+            return False
+        self.last_played[name] = start
+        sound = self.sounds.get(name)
+        if sound is None:
+            return False
+
+        channel = self.mixer.find_channel(True)
+        channel.play(sound)
+
+        latency = time.perf_counter() - start
+        self.played += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        return True
+
+    # Counters and the time play() takes, in milliseconds
+    def stats(self):
+        average = self.total_latency / self.played if self.played else 0.0
+        return {"played": self.played, "limited": self.limited, "avg_ms": round(average * 1000, 3),
+                "max_ms": round(self.max_latency * 1000, 3)}
@@ -0,0 +1,187 @@
+import json
+import os
+import queue
+import threading
+import time
+
+# Session telemetry for cabinets. emit() only puts the event on a SimpleQueue, a writer thread appends
+# it to an NDJSON file (rotated at max_bytes, keeping backups old files) and folds it into the
+# metrics that a small HTTP server hands out in the Prometheus text format on /metrics.
+# The game never waits for the disk or a socket.
+#
+# Events are {"event": name, "time": unix seconds, ...}, the window sends:
+#   game_start  mode, player, width, height
+#   game_end    mode, score, lines, level, pieces (per shape), seconds, pps, apm, missed_frames, tiles
+#               (tile cache counters), sound (effects played and play() time), frame_time, input_latency, line_clear
+#   highscore   score
+#   error       kind ("audio" or "asset"), message
+MAX_BYTES = 1 << 20
+BACKUPS = 3
+QUANTILES = ["p50_ms", "p90_ms", "p99_ms"]
+
+
+# Counters and gauges by name and labels, as Prometheus text
+class Metrics:
+    def __init__(self):
+        self.values = {}  # name -> {labels: value}
+        self.types = {}  # name -> "counter" or "gauge"
+
+    def inc(self, name, value=1, **labels):
+        self.types[name] = "counter"
+        series = self.values.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.types[name] = "gauge"
+        self.values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    # Updates the metrics for one event
+    def observe(self, event):
+        name = event["event"]
+        self.inc("tetris_events_total", event=name)
+        if name == "game_end":
+            mode = event.get("mode", "solo")
+            self.inc("tetris_games_total", mode=mode)
+            self.inc("tetris_lines_total", event["lines"], mode=mode)
+            self.set("tetris_last_score", event["score"], mode=mode)
+            self.set("tetris_last_level", event["level"], mode=mode)
+            for shape, count in event["pieces"].items():
+                self.inc("tetris_pieces_total", count, shape=shape)
+            for summary in ("frame_time", "input_latency"):
+                for quantile in QUANTILES:
+                    if summary in event:
+                        self.set(f"tetris_{summary}_seconds", event[summary][quantile] / 1000,
+                                 quantile=str(int(quantile[1:3]) / 100))
+        elif name == "highscore":
+            self.set("tetris_best_score", event["score"])
+        elif name == "error":
+            self.inc("tetris_errors_total", kind=event["kind"])
+
+    def text(self):
+        lines = []
+        for name in sorted(self.values):
+            lines.append(f"# TYPE {name} {self.types[name]}")
+            for labels, value in sorted(self.values[name].items()):
+                tags = ",".join(f'{key}="{value}"' for key, value in labels)
+                lines.append(f"{name}{{{tags}}} {value}" if tags else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Telemetry:
+    def __init__(self, path=None, port=None, address="127.0.0.1", max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.SimpleQueue()
+        self.metrics = Metrics()
+        self.lock = threading.Lock()  # Between the writer and the HTTP server, the game never takes it
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+        self.server = None
+        if port is not None:
+            self.serve(port, address)
+
+    # Queues an event, never blocks
+    def emit(self, event, **fields):
+        fields["event"] = event
+        fields["time"] = round(time.time(), 3)
+        self.queue.put(fields)
+
+    def error(self, kind, message):
+        self.emit("error", kind=kind, message=message)
+
+    # Writer thread: takes every event that is waiting, writes them in one go
+    def write_loop(self):
+        file = self.open()
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get())
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            with self.lock:
+                for event in batch:
+                    self.metrics.observe(event)
+            if file is not None and batch:
+                try:
+                    file.write("".join(json.dumps(event, separators=(",", ":")) + "\n" for event in batch))
+                    file.flush()
+                    if file.tell() >= self.max_bytes:
+                        file.close()
+                        self.rotate()
+                        file = self.open()
+                except OSError as error:
+                    print(f"Error. Could not write telemetry to '{self.path}' ({error})")
+                    file = None
+        if file is not None:
+            file.close()
+
+    def open(self):
+        if self.path is None:
+            return None
+        try:
+            return open(self.path, "a")
+        except OSError as error:
+            print(f"Error. Could not open the telemetry file '{self.path}' ({error})")
+            return None
+
+    # telemetry.ndjson -> .1 -> .2 ..., the oldest one is dropped
+    def rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    # Serves /metrics on its own thread, returns the port (useful with port 0)
+    def serve(self, port, address="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                with telemetry.lock:
+                    body = telemetry.metrics.text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # No line on stderr for every scrape
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer((address, port), Handler)
+        except OSError as error:
+            print(f"Error. Could not serve metrics on {address}:{port} ({error})")
+            return None
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    # Writes out every queued event and stops the server
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+# Stand-in used when telemetry is off, every call does nothing
+class NullTelemetry:
+    def emit(self, event, **fields):
+        pass
+
+    def error(self, kind, message):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,49 @@
+import threading
+import time
+
+from scores import ScoreJournal
+
+
+def test_add_does_not_wait_for_load(tmp_path, monkeypatch):
+    journal = ScoreJournal(str(tmp_path), migrate=None)
+    for score in range(50):
+        journal.add(score, 0, 1)
+    journal.close()
+
+    journal = ScoreJournal(str(tmp_path), migrate=None)
+    read_snapshot = journal.read_snapshot
+    loading = threading.Event()
+
+    def slow_snapshot():
+        loading.set()
+        time.sleep(0.5)
+        return read_snapshot()
+
+    monkeypatch.setattr(journal, "read_snapshot", slow_snapshot)
+    loader = threading.Thread(target=journal.load)
+    loader.start()
+    loading.wait()
+    start = time.perf_counter()
+    journal.add(1000, 0, 1)
+    blocked = time.perf_counter() - start
+    loader.join()
+    journal.close()
+
+    assert blocked < 0.1
+    scores = journal.top(100)
+    assert len(scores) == 51
+    assert scores[0].score == 1000
+
+
+def test_long_names_survive_compaction(tmp_path):
+    name = "é" * 200  # 400 bytes, the cut at 255 falls inside a character
+    journal = ScoreJournal(str(tmp_path), migrate=None)
+    journal.add(500, 10, 2, name)
+    journal.add(300, 5, 1, "ann")
+    journal.close()
+    journal.compact()
+
+    scores = ScoreJournal(str(tmp_path), migrate=None).read_snapshot()
+    assert [score.score for score in scores] == [500, 300]
+    assert scores[0].player == "é" * 127
+    assert scores[1].player == "ann"
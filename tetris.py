@@ -1,121 +1,136 @@
-from fltk import *
-from PIL import Image
-import io
-import pygame
-import random
-import vlc
-
-
-# Class for rotation of the pieces
-class Piece:
-    def __init__(self, coords):
-        self.coords = coords
-        # to make things easier, when you pass in your list of tuple coordinates
-        # you could have the first coordinate be the center
-        self.center = coords[0]
-
-    def rotate(self, dir="clockwise"):
-        offset_x, offset_y = self.center
-        match dir:
-            case "clockwise":
-                self.coords = [(-(y - offset_y) + offset_x, (x - offset_x) + offset_y) for x, y in self.coords]
-                return self.coords
-
-            case "counterclockwise":
-                self.coords = [((y - offset_y) + offset_x, -(x - offset_x) + offset_y) for x, y in self.coords]
-                return self.coords
+import time
 
+STARTED = time.perf_counter()  # For the startup breakdown, before the imports
 
-# Class for song to loop in background
-class Song:
-    def __init__(self, song_path):
-        self.instance = vlc.Instance()
-        self.player = self.instance.media_player_new()
-        self.media_list = self.instance.media_list_new([song_path])
-        self.media_list_player = self.instance.media_list_player_new()
-        self.media_list_player.set_media_list(self.media_list)
-
-    def loop_sound(self):
-        self.media_list_player.set_playback_mode(1)
-        self.media_list_player.play()
+from fltk import *
+import argparse
+import random
 
-    def stop_sound(self):
-        self.media_list_player.stop()
+from assetcache import AssetCache
+from autoplay import ScriptedPlayer
+from board import Board
+from finesse import FinesseTrainer
+from bundle import open_bundle
+from cells import render_game
+from counters import Counters
+from game import Game, SHAPES, SHAPE_NAMES, GAMEOVER_COLOR
+from loop import FRAME, GameLoop
+from profiler import NullProfiler, PhaseTimer, Profiler
+from replay import Recorder, ReplayPlayer, parse
+from scores import ScoreJournal
+from playfield import PreviewPanel, TileGrid
+from practice import Practice
+from sound import Song, SoundEffects
+from tiles import TileCache
+
+STATS_FRAMES = 15  # Statistics panel refresh, 4 times per second
+BASE_SIZE = 700  # The layout is written for a 700x700 window, other sizes scale all of it
+PRACTICE_FILE = "practice.sav"  # Where a practice game is suspended on exit
+PLAYFIELD = (225, 150, 250, 500)  # Box the board is centered in, cells are as big as fit (25px for 10x20)
+OPPONENT_FIELD = (50, 255, 140, 280)
+
+
+# TileGrid for the visible rows of a board, as big as fits in box (x, y, w, h) and centered there
+def board_grid(board, box, max_size, tiles):
+    x, y, w, h = box
+    rows = board.height - board.hidden
+    size = max(min(max_size, w // board.width, h // rows), 1)
+    return TileGrid(x + (w - board.width * size) // 2, y + (h - rows * size) // 2, board.width, rows, size, tiles)
 
 
 # Main Class
 class Tetris(Fl_Window):
-    def __init__(self, x, y, w, h, label=None):
+    def __init__(self, x, y, w, h, label=None, profiler=None, record=None, startup=None, previews=1,
+                 width=10, height=20, telemetry=None):
+        self.startup = startup if startup is not None else PhaseTimer()  # Reported after the first frame
+        self.startup.mark("imports")
         super(Tetris, self).__init__(x, y, w, h, label)
+        self.scale = min(w, h) / BASE_SIZE
+        self.layout = None  # Every widget with its unscaled geometry, see apply_scale()
+        self.logo_image = None
         self.player = None
+        self.profiler = profiler if profiler is not None else NullProfiler()
+        self.startup_report = False  # Print the startup breakdown after the first frame
+
+        # Game start/end, highscores and errors, written and served on telemetry's own threads
+        if telemetry is None:
+            from telemetry import NullTelemetry  # http.server is only loaded with the metrics server
+            telemetry = NullTelemetry()
+        self.telemetry = telemetry
+        self.mode = "solo"  # solo, practice, versus, replay or attract
+        self.game_started = 0.0
+
+        # Replays
+        self.record_path = record  # Every finished game is saved here when set
+        self.recorder = None
+        self.replay = None  # ReplayPlayer while watching a replay
+        self.replay_speed = 1
+        self.attract_mode = False  # The bot plays until someone presses Enter
+
+        # Versus
+        self.link = None  # Connection to the other player
+        self.match = None  # Match while playing versus, self.engine and self.loop are its local game then
+        self.hosting = False
+        self.delay = None  # Input delay the host asks for, versus.DELAY when None
+        self.solo = None  # (engine, loop) of the single player game, put back after a match
+
+        # Practice, Backspace takes back a piece and Page Up ten, even after gameover
+        self.practice = None
+
+        # Finesse trainer, every piece's presses are checked against the fewest that reach its spot
+        self.finesse = None
         self.begin()
 
-        # Game variables
-        self.lines_score = 0
-        self.score = 0
-        self.formatted_score = "{:06d}".format(self.score)
-
-        # Highscore
-        try:
-            with open("highscore.txt", "r") as file:
-                self.top = int(file.read())
-
-        except FileNotFoundError:
-            print('Error. It seems the file \'highscore.txt\' has been deleted or missing!')
-            self.top = 0
-
-        except ValueError:
-            print('Error. Incorrect value type in \'highscore.txt\'')
-            self.top = 0
+        # Highscore, every finished game goes into the score journal (the full history is only read on demand)
+        self.scores = ScoreJournal()
+        self.player_name = ""
+        self.top = self.scores.best()
 
         # Game variables
         self.formatted_top = "{:06d}".format(self.top)
-        self.next_shape = []
-        self.next_shape_num = -1
-        self.speed = 0.8
-        self.level = 1
-        self.block_list = []
+        self.engine = Game(width=width, height=height + 5)  # Board and rules, the window only renders them
+        self.loop = GameLoop(self.engine)  # Gravity, auto shift and lock delay on a fixed timestep
+        self.formatted_score = "{:06d}".format(self.engine.score)
+        self.keys = {FL_Left: "left", FL_Right: "right", FL_Down: "down", FL_Up: "drop", ord('x'): "cw",
+                     ord('z'): "ccw", ord('c'): "hold", FL_Shift_L: "hold"}
+        self.previews = previews  # Upcoming pieces shown, 1 to 6
         self.game = False
 
         # Sounds and song
-        self.gameover_sound = "Sounds/gameover.wav"
-        self.rotate_sound = "Sounds/rotate.wav"
-        self.land_sound = "Sounds/land.wav"
+        self.gameover_sound = "gameover"
+        self.rotate_sound = "rotate"
+        self.land_sound = "land"
         self.tetris_song = "Sounds/tetris.mp3"
-        self.move_sound = "Sounds/move_horizontal.wav"
-        # self.highscore_sound = "Sounds\\tetris_sound.mp3" (Don't currently have a highscore noise!)
-        self.clearline_sound = "Sounds/clearline.wav"
-        self.tetris_sound = "Sounds/tetris_sound.wav"
-
-        # Sound on game startup
-        pygame.mixer.init()
-        pygame.mixer.music.load(self.tetris_sound)
-        pygame.mixer.music.play()
-
-        # Shapes for the pieces
-        T_shape = [(5, 5), (6, 5), (5, 6), (4, 5), Fl_PNG_Image('Images/color1.png')]
-        S_shape = [(5, 5), (6, 5), (4, 6), (5, 6), Fl_PNG_Image("Images/color2.png")]
-        Z_shape = [(5, 5), (6, 6), (4, 5), (5, 6), Fl_PNG_Image("Images/color3.png")]
-        J_shape = [(5, 5), (4, 5), (6, 6), (6, 5), Fl_PNG_Image("Images/color4.png")]
-        L_shape = [(5, 5), (4, 5), (4, 6), (6, 5), Fl_PNG_Image("Images/color5.png")]
-        I_shape = [(5, 5), (4, 5), (3, 5), (6, 5), Fl_PNG_Image("Images/color6.png")]
-        O_shape = [(4, 6), (5, 6), (4, 5), (5, 5), Fl_PNG_Image("Images/color7.png")]
-        # Color for bricks in gameover
-        self.gameover_color = Fl_PNG_Image("Images/color8.png")
-
-        self.shapes = [T_shape, S_shape, Z_shape, J_shape, L_shape, I_shape, O_shape]
-        self.shape_names = ["T_shape", "S_shape", "Z_shape", "J_shape", "L_shape", "I_shape", "O_shape"]
-        self.shape = []
-        self.current_shape = ''
-
-        # Statistics board nums
-        self.T_stats = 0
-        self.S_stats = 0
-        self.Z_stats = 0
-        self.L_stats = 0
-        self.J_stats = 0
-        self.I_stats = 0
-        self.O_stats = 0
+        self.move_sound = "move_horizontal"
+        # self.highscore_sound = "tetris_sound" (Don't currently have a highscore noise!)
+        self.clearline_sound = "clearline"
+        self.tetris_sound = "tetris_sound"
+
+        # Images and sound effects come decoded from the memory-mapped asset bundle (python bundle.py),
+        # without it from the loose files
+        self.bundle = open_bundle(on_error=self.asset_error)
+        self.startup.mark("asset bundle")
+
+        # Every effect is decoded once on first use, holding a key only plays its sound every so often.
+        # The startup sound plays after the first frame is on screen
+        self.sfx = SoundEffects("Sounds", min_interval={self.move_sound: 0.05, self.rotate_sound: 0.05},
+                                bundle=self.bundle)
+        self.sfx.on_error = self.audio_error
+
+        # Tiles for the 7 piece colors and the color for bricks in gameover, built for the scale in apply_scale()
+        self.assets = AssetCache(bundle=self.bundle)
+        self.assets.on_error = self.asset_error
+        self.tiles = TileCache(self.assets)
+        self.tile_sizes = None
+        self.profiler.watch("missed_frames", lambda: self.loop.missed)
+        self.profiler.watch("tiles", self.tiles.stats)
+        self.profiler.watch("sound", self.sfx.stats)
+
+        # Piece counts, droughts, PPS/APM and line clears, shown every STATS_FRAMES frames instead of on every spawn
+        self.counters = Counters(len(SHAPES))
+        self.loop.counters = self.counters
+        self.stats_frame = 0
+        self.shown_stats = {}  # label box -> text it shows, so unchanged labels aren't redrawn
 
         # Logo creation
         self.logo_highlight2 = Fl_Box(190, 5, 310, 120)
@@ -123,7 +138,6 @@ class Tetris(Fl_Window):
         self.logo_highlight2.color(FL_DARK_CYAN)
 
         self.logo = Fl_Box(195, 15, 300, 100)
-        self.logo.image(self.img_resize('Images/logo.png', 300))
 
         # Score creation
         self.score_highlight1 = Fl_Box(484, 140, 200, 200)
@@ -171,21 +185,33 @@ class Tetris(Fl_Window):
         self.next_shape.labelcolor(FL_WHITE)
         self.next_shape.labelsize(30)
 
-        self.next_grid = []
+        # Next pieces, the first one big and the ones after it small underneath, 3 to a row
+        if self.previews == 1:
+            slots = [(0, 0, 170, 125, 25)]
+        else:
+            slots = [(0, 0, 170, 55, 25)]
+            for i in range(self.previews - 1):
+                slots.append(((i % 3) * 57, 60 + (i // 3) * 32, 56, 30, 10))
+        self.next_panel = PreviewPanel(499, 400, 170, 125, slots, self.tiles)
+
+        # Hold slot
+        self.hold_highlight1 = Fl_Box(25, 15, 160, 180)
+        self.hold_highlight1.box(FL_BORDER_BOX)
+        self.hold_highlight1.color(FL_DARK_CYAN)
+
+        self.hold_highlight2 = Fl_Box(30, 20, 150, 170)
+        self.hold_highlight2.box(FL_BORDER_BOX)
+        self.hold_highlight2.color(FL_WHITE)
 
-        # Grid to display next piece
-        for a in range(4):
-            temp = []
-            for b in range(4):
-                x = 530 + (25 * a)
-                y = 420 + (25 * b)
-                Box = Fl_Box(x, y, 25, 25)
-                Box.box(FL_FLAT_BOX)
-                Box.color(FL_BLACK)
-                temp.append(Box)
-            self.next_grid.append(temp)
+        self.hold_highlight3 = Fl_Box(35, 25, 140, 160)
+        self.hold_highlight3.box(FL_FLAT_BOX)
+        self.hold_highlight3.color(FL_BLACK)
 
-        # MAKE GRID FOR NEXT BLOCKS
+        self.hold_display = Fl_Box(80, 30, 50, 50, "HOLD")
+        self.hold_display.labelcolor(FL_WHITE)
+        self.hold_display.labelsize(30)
+
+        self.hold_panel = PreviewPanel(40, 85, 130, 95, [(0, 0, 130, 95, 25)], self.tiles)
 
         # Speed/level creation
         self.level_highlight1 = Fl_Box(484, 538, 200, 60)
@@ -239,20 +265,10 @@ class Tetris(Fl_Window):
         self.statistics_display.labelsize(25)
 
         self.statistics_list = []
-        self.stats_grid = []
+        self.drought_list = []
 
         # Grid to show piece statistics
-        for a in range(4):
-            temp = []
-
-            for b in range(21):
-                x = 60 + (18 * a)
-                y = 260 + (18 * b)
-                Box = Fl_Box(x, y, 18, 18)
-                Box.box(FL_FLAT_BOX)
-                Box.color(FL_BLACK)
-                temp.append(Box)
-            self.stats_grid.append(temp)
+        self.stats_grid = TileGrid(60, 260, 4, 21, 18, self.tiles)
 
         for a in range(7):
             stats_box = Fl_Box(140, 250 + a * 53, 50, 50, "0")
@@ -262,9 +278,20 @@ class Tetris(Fl_Window):
             stats_box.color(FL_BLACK)
             self.statistics_list.append(stats_box)
 
-            for b in range(4):
-                self.stats_grid[self.shapes[a][b][0] - 4][self.shapes[a][b][1] + a * 3 - 5].image(
-                    self.shapes[a][-1].copy(18, 18))
+            # Current/longest drought
+            drought_box = Fl_Box(130, 288 + a * 53, 70, 14, "")
+            drought_box.labelcolor(FL_DARK3)
+            drought_box.labelsize(11)
+            drought_box.box(FL_FLAT_BOX)
+            drought_box.color(FL_BLACK)
+            self.drought_list.append(drought_box)
+
+            for x, y in SHAPES[a]:
+                self.stats_grid.set((x - 4) % 4, y + a * 3 - 5, a + 1)
+
+        # The other player's board, takes the place of the statistics in versus
+        self.opponent_grid = board_grid(Board(), OPPONENT_FIELD, 14, self.tiles)  # Versus is always 10x20
+        self.opponent_grid.hide()
 
         # Game grid
         self.grid_highlight1 = Fl_Box(215, 140, 270, 520)
@@ -275,417 +302,622 @@ class Tetris(Fl_Window):
         self.grid_highlight2.box(FL_BORDER_BOX)
         self.grid_highlight2.color(FL_WHITE)
 
-        self.grid = []
-        for a in range(10):
-            temp = []
-            for b in range(25):
-                x = 225 + (25 * a)
-                y = 25 + (25 * b)
-
-                Box = Fl_Box(x, y, 25, 25)
-                Box.box(FL_FLAT_BOX)
-                Box.color(FL_BLACK)
-                temp.append(Box)
-                if b < 5:
-                    Box.hide()
-            self.grid.append(temp)
+        # Only the visible rows are drawn, the hidden rows above stay off screen
+        self.grid = board_grid(self.engine.board, PLAYFIELD, 25, self.tiles)
+        self.grid.on_draw = self.grid_drawn
+
+        # PPS, APM and line clears under everything
+        self.stats_line = Fl_Box(25, 665, 655, 30, "")
+        self.stats_line.labelcolor(FL_WHITE)
+        self.stats_line.labelsize(16)
+        self.stats_line.align(FL_ALIGN_INSIDE | FL_ALIGN_LEFT)
+
+        # FPS and frame time overlay, only when profiling
+        self.overlay = None
+        self.overlay_time = 0.0
+        if self.profiler.overlay:
+            self.overlay = Fl_Box(5, 5, 180, 25, "")
+            self.overlay.labelcolor(FL_WHITE)
+            self.overlay.labelsize(14)
+            self.overlay.align(FL_ALIGN_INSIDE | FL_ALIGN_LEFT)
+        self.startup.mark("widgets")
+
+        self.layout = self.record_layout()
+        self.apply_scale(self.scale)
+        self.startup.mark("tiles and logo")
 
     # Controls
     def handle(self, event):
         if event == FL_KEYDOWN:
+            start = self.profiler.begin()
             key = Fl.event_key()
 
             if key == FL_Enter:  # Start/reset the game
+                if self.match is not None:  # Back to playing alone once the match is over
+                    if self.game:
+                        return True
+                    self.end_versus()
                 self.game = True
-                song_path = "Sounds/tetris.mp3"
-                self.player = Song(song_path)
-                self.player.loop_sound()
+                self.attract_mode = False
+                Fl_remove_timeout(self.attract)
+                if self.player is None:  # Same player is reused for every game
+                    self.player = Song(self.tetris_song)
                 self.reset()
+                self.player.loop_sound()
+
+            elif self.practice is not None and key in (FL_BackSpace, FL_Page_Up):
+                self.undo(1 if key == FL_BackSpace else 10)
 
             elif not self.game:  # Only allow controls if game is playing
                 return False
 
-            elif key == FL_Left:  # Move Piece left
-                pygame.mixer.init()
-                pygame.mixer.music.load(self.move_sound)
-                pygame.mixer.music.play()
-                self.move_left()
-
-            elif key == FL_Right:  # Move Piece right
-                pygame.mixer.init()
-                pygame.mixer.music.load(self.move_sound)
-                pygame.mixer.music.play()
-                self.move_right()
-
-            elif key == FL_Up:  # Drop piece
-                self.insta_down()
-
-            elif key == FL_Down:
-                self.move_down(True)
-
-            elif key == ord('x'):  # Rotate piece clockwise
-                pygame.mixer.init()
-                pygame.mixer.music.load(self.rotate_sound)
-                pygame.mixer.music.play()
-
-                if self.current_shape == "O_shape":  # Don't need to rotate square
-                    return False
-
-                rotated_shape = Piece(self.shape[:-1])
-                self.rotate_shape(rotated_shape.rotate('clockwise'))
-
-            elif key == ord('z'):  # Rotate piece counter clockwise
-                pygame.mixer.init()
-                pygame.mixer.music.load(self.rotate_sound)
-                pygame.mixer.music.play()
-
-                if self.current_shape == "O_shape":  # Don't need to rotate square
-                    return False
-
-                rotated_shape = Piece(self.shape[:-1])
-                self.rotate_shape(rotated_shape.rotate('counterclockwise'))
+            elif key in self.keys:  # Left, right, soft drop, drop and rotations happen on the next frame
+                match = self.match  # In versus a press is played delay frames later
+                self.profiler.input(self.loop.frame if match is None else match.frame + match.delay)
+                self.controls().press(self.keys[key])
 
             else:
                 return False
+            self.profiler.end("input", start)
             return True
-        return super(Tetris, self).handle(event)
 
-    # Better image resizer (Thanks Mr. Ark)
-    def img_resize(self, fname, width):
-        """resizes any image type using high quality PIL library"""
-        img = Image.open(fname)  # opens all image formats supported by PIL
-        w, h = img.size
-        height = int(width * h / w)  # correct aspect ratio
-        img = img.resize((width, height), Image.Resampling.BICUBIC)  # high quality resizing
-        mem = io.BytesIO()  # byte stream memory object
-        img.save(mem, format="PNG")  # converts image type to PNG byte stream
-        siz = mem.tell()  # gets size of image in bytes without reading again
-        return Fl_PNG_Image(None, mem.getbuffer(), siz)
-
-    # Display the next shape
-    def nextshape(self):
-        ns = self.next_shape_num
-        self.next_shape_num = random.randrange(len(self.shapes))
-        self.next_shape = self.shapes[self.next_shape_num].copy()
-
-        # Clear next grid and draw new shape
-        for x in range(4):
-            for y in range(4):
-                self.next_grid[x][y].image(None)
-                self.next_grid[x][y].redraw()
-
-        for x in range(len(self.next_shape) - 1):
-            self.next_grid[self.next_shape[x][0] - 4][self.next_shape[x][1] - 9].image(self.next_shape[-1].copy(25, 25))
-            self.next_grid[self.next_shape[x][0] - 4][self.next_shape[x][1] - 9].redraw()
-
-        # Only for first piece
-        if ns == -1:
-            ns = random.randrange(len(self.shapes))
-        return ns
-
-    # Creates a new shape, if there is no room for it, gameover
-    def newshape(self):
-        ns = self.nextshape()
-        self.shape = self.shapes[ns].copy()
-        self.current_shape = self.shape_names[ns]
-        self.statistics_list[self.shapes.index(self.shape)].label(
-            str(int(self.statistics_list[self.shapes.index(self.shape)].label()) + 1))
-        for x in range(len(self.shape) - 1):
-
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-            if self.grid[self.shape[x][0]][self.shape[x][1]].image() != None:
-                self.gameover()
-                return False
-
-        for x in range(len(self.shape) - 1):
-            self.grid[self.shape[x][0]][self.shape[x][1]].image(self.shape[-1].copy(25, 25))
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-        Fl_add_timeout(self.speed, self.move_down, False)
-
-    # Move the block down repeatedly by either timeout and player control(to speed up)
-    def move_down(self, key):
-        for x in range(len(self.shape) - 1):
-            if self.shape[x][1] + 1 >= 25:  # Bottom of grid, can not be moved down
-                if not key:
-                    pygame.mixer.init()
-                    pygame.mixer.music.load(self.land_sound)
-                    pygame.mixer.music.play()
-
-                    Fl_remove_timeout(self.move_down)
-                    self.clear_lines()
-
-                    self.newshape()
-
-                return
-            if self.grid[self.shape[x][0]][self.shape[x][1] + 1].image() != None:  # Hit a piece, can not move down
-                if (self.shape[x][0], self.shape[x][1] + 1) not in self.shape:  # Make sure image isn't part of the current piece
-                    if key == False:
-                        pygame.mixer.init()
-                        pygame.mixer.music.load(self.land_sound)
-                        pygame.mixer.music.play()
-                        Fl_remove_timeout(self.move_down)
-                        self.clear_lines()
-
-                        self.add_points(50, 0)
-                        self.newshape()
-
-                    return
-
-        # Moving of the piece down (y+1)
-        for x in range(len(self.shape) - 1):
-            self.grid[self.shape[x][0]][self.shape[x][1]].image(None)
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-            self.shape[x] = (self.shape[x][0], self.shape[x][1] + 1)
-
-        for x in range(len(self.shape) - 1):
-            if self.shape[x][1] < 0:
-                continue
-            self.grid[self.shape[x][0]][self.shape[x][1]].image(self.shape[-1].copy(25, 25))
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-        if key == False:
-            Fl_add_timeout(self.speed, self.move_down, False)
-
-    # Player left input
-    def move_left(self):
-        for x in range(len(self.shape) - 1):  # Make sure in bounds of grid and not moving into other pieces
-            if self.shape[x][0] - 1 < 0:
-                return
-            if self.grid[self.shape[x][0] - 1][self.shape[x][1]].image() != None:
-                if (self.shape[x][0] - 1, self.shape[x][1]) not in self.shape:
-                    return
-
-        for x in range(len(self.shape) - 1):
-            self.grid[self.shape[x][0]][self.shape[x][1]].image(None)
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-            self.shape[x] = (self.shape[x][0] - 1, self.shape[x][1])
-
-        for x in range(len(self.shape) - 1):
-            self.grid[self.shape[x][0]][self.shape[x][1]].image(self.shape[-1].copy(25, 25))
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-    # Player right input
-    def move_right(self):
-        for x in range(len(self.shape) - 1):  # Make sure in bounds of grid and not moving into other pieces
-            if self.shape[x][0] + 1 >= 10:
-                return
-            if self.grid[self.shape[x][0] + 1][self.shape[x][1]].image() != None:
-                if (self.shape[x][0] + 1, self.shape[x][1]) not in self.shape:
-                    return
-
-        for x in range(len(self.shape) - 1):
-            self.grid[self.shape[x][0]][self.shape[x][1]].image(None)
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-            self.shape[x] = (self.shape[x][0] + 1, self.shape[x][1])
-
-        for x in range(len(self.shape) - 1):
-            self.grid[self.shape[x][0]][self.shape[x][1]].image(self.shape[-1].copy(25, 25))
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-    # Instantly drops piece to the lowest position
-    def insta_down(self):  # Similar to move down but instant and only redefines image at end of process
-        for x in range(len(self.shape) - 1):
-            self.grid[self.shape[x][0]][self.shape[x][1]].image(None)
-            self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-        for x in range(len(self.shape) - 1):
-            if self.shape[x][1] + 1 >= 25:
-                for x in range(len(self.shape) - 1):
-                    self.grid[self.shape[x][0]][self.shape[x][1]].image(self.shape[-1].copy(25, 25))
-                    self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-                pygame.mixer.init()
-                pygame.mixer.music.load(self.land_sound)
-                pygame.mixer.music.play()
-
-                Fl_remove_timeout(self.move_down)
-                self.clear_lines()
-                self.newshape()
-
-                return
-            if self.grid[self.shape[x][0]][self.shape[x][1] + 1].image() != None:
-                if (self.shape[x][0], self.shape[x][1] + 1) not in self.shape:
-                    for x in range(len(self.shape) - 1):
-                        self.grid[self.shape[x][0]][self.shape[x][1]].image(self.shape[-1].copy(25, 25))
-                        self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-                    pygame.mixer.init()
-                    pygame.mixer.music.load(self.land_sound)
-                    pygame.mixer.music.play()
-                    Fl_remove_timeout(self.move_down)
-                    self.clear_lines()
-
-                    self.add_points(50, 0)
-                    self.newshape()
-
-                    return
-
-        for x in range(len(self.shape) - 1):
-            self.shape[x] = (self.shape[x][0], self.shape[x][1] + 1)
-
-        self.insta_down()
-
-    # Rotation of current piece
-    def rotate_shape(self, newshape):
-        for x in range(len(newshape)):  # Make sure in bounds
-
-            if newshape[x][0] >= 10:
-                return
+        if event == FL_KEYUP:
+            key = Fl.event_key()
+            if key in self.keys:
+                self.controls().release(self.keys[key])
+                return True
+        return super(Tetris, self).handle(event)
 
-            if newshape[x][1] >= 20:
-                return
+    # Unscaled geometry of every widget: (widget, x, y, w, h, label size, tile size for grids)
+    def record_layout(self):
+        widgets = []
+        for value in vars(self).values():
+            if isinstance(value, Fl_Widget):
+                widgets.append(value)
+            elif isinstance(value, list):
+                widgets += [item for item in value if isinstance(item, Fl_Widget)]
+        return [(widget, widget.x(), widget.y(), widget.w(), widget.h(), widget.labelsize(),
+                 widget.size if isinstance(widget, TileGrid) else 0) for widget in widgets]
+
+    # Scaled pixels
+    def px(self, n):
+        return round(n * self.scale)
+
+    # Lays the whole window out again at a scale, centered. Tiles, previews and the logo are resized
+    # once here through the asset cache, drawing never scales anything
+    def apply_scale(self, scale):
+        self.scale = scale
+        left = (self.w() - self.px(BASE_SIZE)) // 2
+        top = (self.h() - self.px(BASE_SIZE)) // 2
+        for widget, x, y, w, h, labelsize, size in self.layout:
+            if size:
+                widget.size = self.px(size)
+                w = widget.cols * widget.size
+                h = widget.rows * widget.size
+            else:
+                w = self.px(w)
+                h = self.px(h)
+            widget.resize(left + self.px(x), top + self.px(y), w, h)
+            widget.labelsize(max(self.px(labelsize), 1))
+            if isinstance(widget, PreviewPanel):
+                widget.scale = scale
+
+        tile_sizes = [self.grid.size, self.stats_grid.size, self.opponent_grid.size]
+        if tile_sizes != self.tile_sizes:
+            self.tile_sizes = tile_sizes
+            self.tiles.rebuild(tile_sizes, [self.px(25), self.px(10)])
+            if self.logo_image is not None:
+                self.assets.release(self.logo_image)
+            self.logo_image = self.img_resize('Images/logo.png', self.px(300))
+            self.logo.image(self.logo_image)
+        self.redraw()
 
-            if newshape[x][0] < 0:
-                return
+    # The window was resized, the new scale is applied once the size stops changing
+    def resize(self, x, y, w, h):
+        resized = w != self.w() or h != self.h()
+        super(Tetris, self).resize(x, y, w, h)
+        if resized and self.layout is not None:
+            Fl_remove_timeout(self.rescale)
+            Fl_add_timeout(0.1, self.rescale)
 
-            if self.grid[newshape[x][0]][newshape[x][1]].image() != None:  # Make sure not to rotate into other blocks
-                if (newshape[x][0], newshape[x][1]) not in self.shape:
-                    if newshape[x][1] > 0:
-                        return
-
-        for x in range(len(self.shape) - 1):
-            if self.shape[x][1] > 0:
-                self.grid[self.shape[x][0]][self.shape[x][1]].image(None)
-                self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-        self.shape[:-1] = newshape
-
-        for x in range(len(self.shape) - 1):
-            if self.shape[x][1] > 0:
-                self.grid[self.shape[x][0]][self.shape[x][1]].image(self.shape[-1].copy(25, 25))
-                self.grid[self.shape[x][0]][self.shape[x][1]].redraw()
-
-    # Check if line is full, clear full lines and move everything above down
-    def clear_lines(self):
-
-        cleared_lines = []
-        for y in range(5, 25):  # Checks all lines
-            line_empty = False
-            for x in range(10):
-                if self.grid[x][y].image() == None:
-                    line_empty = True
-                    break
-            if not line_empty:
-                cleared_lines.append(y)  # List of lines needed to be cleared
-        if cleared_lines == 0:
-            return
+    def rescale(self, data=None):
+        self.apply_scale(min(self.w(), self.h()) / BASE_SIZE)
 
-        for line in cleared_lines:
-            for x in range(10):
-                self.grid[x][line].image(None)
-                self.grid[x][line].redraw()
-            for y in range(line, 0, -1):
-                for x in range(10):  # Moving everything above down
-                    if self.grid[x][y - 1].image() != None:
-                        self.grid[x][y].image(self.grid[x][y - 1].image().copy(25, 25))
-                        self.grid[x][y].redraw()
-                        self.grid[x][y - 1].image(None)
-                        self.grid[x][y - 1].redraw()
-
-        if len(cleared_lines) > 0:
-            self.add_points(len(cleared_lines), len(cleared_lines))
-
-    # Score, Highscore, lines, and level calculation
-    def add_points(self, points, lines):
-        if lines > 0:
-            if lines < 4:
-                pygame.mixer.init()
-                pygame.mixer.music.load(self.clearline_sound)
-                pygame.mixer.music.play()
-
-            if lines == 1:
-                points = 400
-
-            elif lines == 2:
-                points = 800
-
-            elif lines == 3:
-                points = 1200
-
-            if lines == 4:  # Tetris!
-                points = 2000
-
-                pygame.mixer.init()
-                pygame.mixer.music.load(self.tetris_sound)
-                pygame.mixer.music.play()
-
-        # Reformatting displays
-        self.lines_score += lines
-        if self.lines_score > 0:
-            self.line_display.label(f"  LINES {str(self.lines_score)}")
+    # Better image resizer (Thanks Mr. Ark), the resized image is cached on disk
+    def img_resize(self, fname, width):
+        return self.assets.scaled(fname, width)
+
+    # Plays a sound effect
+    def play(self, sound):
+        start = self.profiler.begin()
+        self.sfx.play(sound)
+        self.profiler.end("audio", start)
+
+    # Reacts to everything that happened in the game since the last update, then draws it
+    def update(self):
+        for event, value in self.engine.pop_events():
+            if event == "move":
+                self.play(self.move_sound)
+
+            elif event == "rotate":
+                self.play(self.rotate_sound)
+
+            elif event == "land":
+                self.play(self.land_sound)
+                if self.finesse is not None and self.match is None:
+                    self.show_finesse(self.finesse.land(*value))
+
+            elif event == "clear":
+                self.profiler.add("line_clear", *self.engine.last_clear)
+                self.counters.clear(len(value))
+                self.clear_animation(value)
+                if len(value) < 4:
+                    self.play(self.clearline_sound)
+                else:  # Tetris!
+                    self.play(self.tetris_sound)
+
+            elif event == "score":
+                self.show_score()
+
+            elif event == "hold":
+                self.hold_panel.set(0, value)
+
+            elif event == "deal":  # Pieces swapped back in from hold aren't counted again
+                self.counters.spawn(value)
+
+            elif event == "spawn":
+                self.show_next()
+                if self.practice is not None:
+                    self.practice.record(self.engine)
+
+            elif event == "gameover":
+                self.gameover()
+        self.render()
+
+    # Hands the changed rows to the grid widget, which repaints only the cells that changed
+    def render(self):
+        render_game(self.engine, self.grid)
+
+    # The grid finished drawing, so every key press before it is now on screen
+    def grid_drawn(self, start, seconds):
+        self.profiler.add("render", start, seconds)
+        self.profiler.drawn(self.loop.frame)
+
+        if self.startup is not None:  # First frame
+            self.startup.mark("first frame")
+            if self.startup_report:
+                print(self.startup.report())
+            self.startup = None
+            Fl_add_timeout(0.0, self.startup_sound)
+
+    # Sound on game startup, loading the sounds happens here too
+    def startup_sound(self, data=None):
+        self.play(self.tetris_sound)
+
+    # Briefly flashes the cleared lines, the game keeps going underneath
+    def clear_animation(self, lines):
+        hidden = self.engine.board.hidden
+        self.grid.flash([y - hidden for y in lines if y >= hidden], GAMEOVER_COLOR)
+        Fl_remove_timeout(self.end_clear_animation)
+        Fl_add_timeout(0.1, self.end_clear_animation)
+
+    def end_clear_animation(self, data=None):
+        self.grid.unflash()
+
+    # Runs once per frame, the loop works out from the clock how many frames of game time are due
+    def tick(self, data=None):
+        Fl_repeat_timeout(FRAME, self.tick)
+        self.profiler.frame()
+        start = self.profiler.begin()
+        if self.replay is not None:
+            playing = self.replay.advance(self.replay_speed)
+        elif self.match is not None:  # Never waits on the network, without the inputs no frames run
+            self.match.sync()
+            self.match.advance()
+        else:
+            self.loop.advance()
+        self.update()
+        if self.match is not None:
+            render_game(self.match.opponent(), self.opponent_grid)
+            self.match.opponent().pop_events()
+            if self.match.winner() is not None and self.game:
+                self.versus_over()
+        if self.loop.frame - self.stats_frame >= STATS_FRAMES:
+            self.stats_frame = self.loop.frame
+            self.show_stats()
+        self.profiler.end("logic", start)
+
+        if self.replay is not None and not playing:
+            self.replay = None
+            Fl_remove_timeout(self.tick)
+
+        if not self.grid.dirty:  # Nothing to draw, so no key press is waiting on the screen
+            self.profiler.drop_inputs(self.loop.frame)
+        if self.overlay is not None and start - self.overlay_time >= 0.5:
+            self.overlay_time = start
+            self.overlay.label(f"FPS {self.profiler.fps():.0f}  p99 {self.profiler.frame_times.percentile(99) * 1000:.1f}ms")
+            self.overlay.redraw_label()
+
+    # Display the next shapes, only the slots that got a different shape are redrawn
+    def show_next(self):
+        for slot, shape in enumerate(self.engine.queue.upcoming(self.previews)):
+            self.next_panel.set(slot, shape)
+
+    # Score, Highscore, lines, and level displays
+    def show_score(self):
+        if self.engine.lines > 0:
+            self.line_display.label(f"  LINES {str(self.engine.lines)}")
             self.line_display.redraw_label()
 
-        self.score += points
-        self.formatted_score = "{:06d}".format(self.score)
+        self.formatted_score = "{:06d}".format(self.engine.score)
         self.score_score_display.label(self.formatted_score)
         self.score_score_display.redraw_label()
 
-        if self.score > self.top:
-            self.top = self.score
+        if self.engine.score > self.top and not self.watching():
+            self.top = self.engine.score
             self.formatted_top = "{:06d}".format(self.top)
             self.score_top_display.label(self.formatted_top)
 
-        if self.level == 5:
-            return
-        if self.level != self.lines_score // 10 + 1:  # Increase speed every 10 lines or 1 level up to 5 times
-            self.speed = self.speed / 1.5
-        self.level = self.lines_score // 10 + 1
-        self.level_display.label(f"  LEVEL {str(self.level)}")
+        self.level_display.label(f"  LEVEL {str(self.engine.level)}")
         self.level_display.redraw_label()
-        return
-
-    # Resets the game
-    def reset(self):
-        self.player.stop_sound()
-        for x in range(10):
-            for y in range(25):
-                self.grid[x][y].image(None)
-
-        for x in range(7):
-            self.statistics_list[x].label("0")
-
-        for x in range(4):
-            for y in range(4):
-                self.next_grid[x][y].image(None)
-
-        self.lines_score = 0
-        self.level = 1
-        self.score = 0
-        self.formatted_score = "{:06d}".format(self.score)
+
+    # Statistics panel, only the labels whose text changed are redrawn
+    def show_stats(self):
+        counters = self.counters
+        for shape in range(len(SHAPES)):
+            self.set_label(self.statistics_list[shape], str(counters.counts[shape]))
+            self.set_label(self.drought_list[shape], f"dry {counters.drought(shape)}/{counters.max_drought(shape)}")
+        if self.finesse is not None:  # The line shows the finesse results instead
+            return
+        clears = "  ".join(f"{name} {count}" for name, count in counters.clear_types().items())
+        self.set_label(self.stats_line, f"PPS {counters.pps():.2f}  APM {counters.apm():.0f}  {clears}")
+
+    # Result of the last checked piece, red when it took too many presses (None = not checked)
+    def show_finesse(self, fault):
+        if fault is None:
+            return
+        self.stats_line.labelcolor(FL_RED if fault else FL_GREEN)
+        self.set_label(self.stats_line, self.finesse.report())
+
+    def set_label(self, box, text):
+        if self.shown_stats.get(box) != text:
+            self.shown_stats[box] = text
+            box.label(text)
+            box.redraw_label()
+
+    # Resets the game, mode is what kind of game comes next
+    def reset(self, mode="solo"):
+        if self.player is not None:
+            self.player.stop_sound()
+        Fl_remove_timeout(self.tick)
+
+        # Every game gets its own seed so it can be recorded and replayed
+        self.replay = None
+        self.loop.player = None
+        seed = random.randrange(2 ** 32)
+        self.engine.reset(seed)
+        self.loop.reset()
+        self.recorder = Recorder(seed)
+        self.loop.recorder = self.recorder
+
+        self.counters.reset()
+        self.stats_frame = 0
+        self.show_stats()
+
+        self.next_panel.clear()
+        self.hold_panel.clear()
+
+        # Only the labels that change are redrawn, not the whole window
+        self.formatted_score = "{:06d}".format(self.engine.score)
+        self.score_score_display.label(self.formatted_score)
+        self.score_score_display.redraw_label()
         self.score_top_display.label(str(self.formatted_top))
+        self.score_top_display.redraw_label()
         self.line_display.label("LINES 0")
+        self.line_display.redraw_label()
         self.level_display.label("LEVEL 1")
-        self.speed = 0.8
-        Fl_remove_timeout(self.move_down)
-        self.redraw()
+        self.level_display.redraw_label()
 
-        self.newshape()
+        if self.practice is not None:  # New game, nothing to take back
+            self.practice.clear()
+        if self.finesse is not None:
+            self.finesse.reset()
+            self.set_label(self.stats_line, self.finesse.report())
+        self.engine.new_shape()
+        self.update()
+        Fl_add_timeout(FRAME, self.tick)
+
+        self.mode = mode
+        if mode == "solo" and self.practice is not None:
+            self.mode = "practice"
+        elif mode == "solo" and self.finesse is not None:
+            self.mode = "finesse"
+        self.game_started = time.perf_counter()
+        board = self.engine.board
+        self.telemetry.emit("game_start", mode=self.mode, player=self.player_name, width=board.width,
+                            height=board.height - board.hidden)
+
+    # Everything about the game that just ended, for the telemetry
+    def report_game(self, **fields):
+        engine = self.engine
+        counters = self.counters
+        fields.update(mode=self.mode, score=engine.score, lines=engine.lines, level=engine.level,
+                      pieces={SHAPE_NAMES[shape].split("_")[0]: counters.counts[shape] for shape in range(len(SHAPES))},
+                      seconds=round(time.perf_counter() - self.game_started, 3), pps=round(counters.pps(), 3),
+                      apm=round(counters.apm(), 1))
+        fields.update(missed_frames=self.loop.missed, tiles=self.tiles.stats(), sound=self.sfx.stats())
+        if self.profiler.enabled:  # Summaries of the session so far
+            fields.update(frame_time=self.profiler.frame_times.summary(),
+                          input_latency=self.profiler.input_latency.summary(),
+                          line_clear=self.profiler.phases["line_clear"].summary())
+        self.telemetry.emit("game_end", **fields)
+
+    def audio_error(self, message):
+        self.telemetry.error("audio", message)
+
+    def asset_error(self, message):
+        self.telemetry.error("asset", message)
+
+    # Plays a replay back at speed times normal speed, the keys do nothing until Enter starts a new game
+    def watch(self, data, speed=1):
+        try:  # A broken replay or one for another board size is reported before the game on screen is touched
+            seed, size, *rest = parse(data)
+            board = self.engine.board
+            if size != (board.width, board.height):
+                raise ValueError(f"it is for a {size[0]}x{size[1]} board, not {board.width}x{board.height}")
+        except ValueError as error:
+            print(f"Error. Could not play the replay: {error}")
+            return
+        self.reset("replay")
+        self.loop.recorder = None
+        self.replay = ReplayPlayer(data, self.engine, self.loop)
+        self.replay_speed = speed
+        self.counters.reset()  # The replay starts its game over
+
+    # Attract mode, the bot plays a game on its own (with one piece lookahead)
+    def attract(self, data=None):
+        from bot import Bot  # NumPy is only loaded when the bot plays
+
+        self.attract_mode = True
+        self.reset("attract")
+        self.loop.recorder = None
+        self.loop.player = ScriptedPlayer(self.loop, Bot(lookahead=True), delay=4)
+
+    # True while the game on screen isn't being played by a person
+    def watching(self):
+        return self.replay is not None or self.loop.player is not None
+
+    # Keys go to the match in versus, it sends them to the other player and plays them a few frames later
+    def controls(self):
+        return self.match if self.match is not None else self.loop
+
+    # Hosts a versus match (host=True) or joins one over an open link, the match starts once both are there
+    def versus(self, link, host, delay=None):
+        self.link = link
+        self.hosting = host
+        self.delay = delay
+        self.statistics_display.label(" WAITING...")
+        Fl_add_timeout(0.1, self.wait_for_opponent)
+
+    def wait_for_opponent(self, data=None):
+        from versus import DELAY, Match, hello, read_hello
+
+        messages = self.link.receive()
+        for i, message in enumerate(messages):
+            if message is None:
+                self.statistics_display.label(" NO OPPONENT")
+                return
+            match = None
+            if message == b"" and self.hosting:
+                seed = random.randrange(2 ** 32)
+                delay = self.delay if self.delay is not None else DELAY
+                self.link.send(hello(seed, delay))
+                match = Match(seed, 0, self.link, delay)
+            elif read_hello(message) is not None:
+                seed, delay = read_hello(message)
+                match = Match(seed, 1, self.link, delay)
+            if match is not None:
+                match.take(messages[i + 1:])  # The host's first presses often come with HELLO
+                self.start_versus(match)
+                return
+        Fl_repeat_timeout(0.1, self.wait_for_opponent)
+
+    def start_versus(self, match):
+        self.solo = (self.engine, self.loop)
+        self.reset("versus")
+        self.match = match
+        self.engine = match.game()
+        self.loop = match.loops[match.local]
+        self.loop.counters = self.counters
+        self.counters.reset()
+        self.recorder = None
+        self.game = True
+        self.show_versus(True)
+        if self.player is None:
+            self.player = Song(self.tetris_song)
+        self.player.loop_sound()
+
+    # Statistics or the other player's board
+    def show_versus(self, versus):
+        for widget in [self.stats_grid] + self.statistics_list + self.drought_list:
+            if versus:
+                widget.hide()
+            else:
+                widget.show()
+        if versus:
+            self.opponent_grid.show()
+        else:
+            self.opponent_grid.hide()
+        self.statistics_display.label(" OPPONENT" if versus else " STATISTICS")
 
-        return
+    def versus_over(self):
+        from versus import DRAW
+
+        self.game = False
+        Fl_remove_timeout(self.tick)
+        self.show_stats()
+        if self.player is not None:
+            self.player.stop_sound()
+        winner = self.match.winner()
+        won = winner == self.match.local
+        draw = winner == DRAW
+        self.level_display.label("DRAW" if draw else "YOU WIN!" if won else "YOU LOSE")
+        self.level_display.redraw_label()
+        print(("Draw. " if draw else "You win! " if won else "You lose. ") + self.match.report())
+        self.report_game(won=won, draw=draw)
+        self.play(self.gameover_sound)
+
+    # Back to the single player game
+    def end_versus(self):
+        self.engine, self.loop = self.solo
+        self.match = None
+        self.show_versus(False)
+
+    # Finesse training, a normal game where every piece's presses are checked as it lands
+    def start_finesse(self):
+        self.finesse = FinesseTrainer(self.engine.board.width)  # Tables come from the disk cache after the first time
+        self.loop.trainer = self.finesse
+
+    # Practice mode, resumes the game suspended on the last exit if there is one
+    def start_practice(self, path=PRACTICE_FILE):
+        self.practice = Practice()
+        self.game = True
+        self.reset()
+        try:
+            self.practice.resume(path, self.engine)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            print(f"Error. Could not resume practice: {error}")
+            return
+        self.restored()
+
+    # Takes back steps pieces
+    def undo(self, steps):
+        if self.practice.undo(self.engine, steps):
+            self.restored()
+
+    # The engine jumped to another state, everything on screen follows it
+    def restored(self):
+        self.loop.reset()
+        self.show_next()
+        self.hold_panel.set(0, self.engine.held)
+        self.show_score()
+        self.render()
+        if not self.game:  # Undo after gameover
+            self.game = True
+            Fl_add_timeout(FRAME, self.tick)
+
+    # Saves the practice game for the next start
+    def suspend(self, path=PRACTICE_FILE):
+        if self.practice is not None and self.practice.history:
+            self.practice.save(path, self.engine)
 
     # Gameover D:
     def gameover(self):
+        if self.match is not None:  # See versus_over()
+            return
         self.game = False
-        self.player.stop_sound()
-        if self.score == self.top:  # If new highscore, save it
-            with open("highscore.txt", "w") as file:
-                file.write(str(self.top))
+        Fl_remove_timeout(self.tick)
+        self.show_stats()
+        if self.player is not None:
+            self.player.stop_sound()
+        self.report_game()  # Queued for the telemetry thread, nothing is written here
+        if self.attract_mode:  # Next attract game in a few seconds
+            Fl_add_timeout(3.0, self.attract)
+        elif not self.watching() and self.practice is None:
+            # Saved on the journal's writer thread, the UI never waits for the disk
+            self.scores.add(self.engine.score, self.engine.lines, self.engine.level, self.player_name)
+            if self.engine.score == self.top:
                 print('New Highscore!')
+                self.telemetry.emit("highscore", score=self.engine.score)
 
-        pygame.mixer.init()
-        pygame.mixer.music.load(self.gameover_sound)
-        pygame.mixer.music.play()
+            if self.record_path:
+                self.recorder.save(self.record_path, self.loop.frame, self.engine)
 
-        for x in range(10):
-            for y in range(25):
-                self.grid[x][y].image(self.gameover_color.copy(25, 25))
-
-        self.redraw()
+        self.play(self.gameover_sound)
 
 
 if __name__ == "__main__":
-    window = Tetris(100, 100, 700, 700, "Tetris")
+    parser = argparse.ArgumentParser(description="Tetris")
+    parser.add_argument("--profile", action="store_true", help="time every frame and show FPS/p99 on screen")
+    parser.add_argument("--trace", metavar="FILE", help="with --profile, write the session trace here on exit")
+    parser.add_argument("--record", metavar="FILE", help="save a replay of every finished game here")
+    parser.add_argument("--replay", metavar="FILE", help="watch a replay")
+    parser.add_argument("--speed", type=int, default=1, help="with --replay, frames played per frame")
+    parser.add_argument("--autoplay", action="store_true", help="attract mode, the bot plays until Enter is pressed")
+    parser.add_argument("--startup-times", action="store_true", help="print how long each part of startup took")
+    parser.add_argument("--player", default="", help="name saved with your scores")
+    parser.add_argument("--previews", type=int, default=1, choices=range(1, 7), help="next pieces shown (1-6)")
+    parser.add_argument("--scale", default="1", help="window scale, e.g. 2 or 1.5, or auto to fit the screen")
+    parser.add_argument("--host", type=int, metavar="PORT", help="host a versus match on this port")
+    parser.add_argument("--join", metavar="HOST:PORT", help="join a versus match")
+    parser.add_argument("--delay", type=int, help="versus input delay in frames, 3 by default")
+    parser.add_argument("--practice", action="store_true", help="practice with unlimited undo, suspended on exit")
+    parser.add_argument("--finesse", action="store_true", help="finesse trainer, flags pieces placed with extra presses")
+    parser.add_argument("--width", type=int, default=10, help="board columns, at least 4")
+    parser.add_argument("--height", type=int, default=20, help="visible board rows, at least 4")
+    parser.add_argument("--telemetry", metavar="FILE", help="log game and error events here as NDJSON (rotated)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="serve Prometheus metrics on localhost:PORT")
+    args = parser.parse_args()
+
+    telemetry = None
+    profiler = Profiler() if args.profile else None
+    if args.telemetry or args.metrics_port is not None:
+        from telemetry import Telemetry  # Loaded only when asked for, like asyncio for versus
+
+        telemetry = Telemetry(args.telemetry, args.metrics_port)
+        if profiler is None:  # Frame time and input latency for the telemetry, without the overlay
+            profiler = Profiler(trace_size=0, overlay=False)
+    scale = min(Fl.w(), Fl.h()) * 0.9 / BASE_SIZE if args.scale == "auto" else float(args.scale)
+    size = round(BASE_SIZE * scale)
+    width, height = max(args.width, 4), max(args.height, 4)
+    if (args.host is not None or args.join) and (width, height) != (10, 20):
+        print("Error. Versus is played on the 10x20 board")
+        width, height = 10, 20
+    window = Tetris(50, 50, size, size, "Tetris", profiler, args.record, PhaseTimer(STARTED), args.previews,
+                    width, height, telemetry)
+    window.startup_report = args.startup_times
+    window.player_name = args.player
     window.end()
+    window.resizable(window)
+    window.size_range(BASE_SIZE // 2, BASE_SIZE // 2)
     window.show()
+    if args.finesse:
+        window.start_finesse()
+    if args.replay:
+        with open(args.replay, "rb") as file:
+            window.watch(file.read(), args.speed)
+    elif args.autoplay:
+        window.attract()
+    elif args.practice:
+        window.start_practice()
+    elif args.host is not None:
+        from versus import Link
+
+        link = Link()
+        try:
+            link.host(args.host)
+            window.versus(link, True, args.delay)
+        except OSError as error:
+            print(f"Error. Could not host a match on port {args.host} ({error})")
+            link.close()
+    elif args.join:
+        from versus import Link
+
+        address, port = args.join.rsplit(":", 1)
+        link = Link()
+        link.join(address, int(port))
+        window.versus(link, False)
     Fl.run()
+    window.suspend()
+    if window.link is not None:
+        window.link.close()
+    window.scores.close()
+    if telemetry is not None:
+        telemetry.close()
+
+    if args.profile:
+        print(profiler.summary())
+        if args.trace:
+            profiler.dump(args.trace)
@@ -0,0 +1,89 @@
+from pieces import SHAPES
+
+MIN_TILE = 6  # Smaller cells are drawn as flat squares in the tile's average color, not as images
+
+# Every (color, size) tile image is built once and shared by all the grids,
+# so moving pieces or clearing lines never allocates new images. The scaled tiles come from
+# the AssetCache, so after the first start they are read straight from disk.
+# Color numbers match the board: 1-7 are the pieces, 8 is the color for bricks in gameover.
+# Whole pieces for the previews are put together from the tiles once as well.
+class TileCache:
+    def __init__(self, assets, colors=8):
+        self.assets = assets
+        self.colors = colors
+        self.tiles = {}  # (color, size) -> scaled image
+        self.pieces = {}  # (shape, size) -> image of the whole piece
+        self.flats = {}  # color -> (r, g, b) for cells smaller than MIN_TILE
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0  # Approximate pixel memory held by the scaled tiles
+
+    # Builds the tiles for every color at the given sizes (and the preview pieces), meant to run at startup
+    def preload(self, sizes, piece_sizes=()):
+        for size in sizes:
+            for color in range(1, self.colors + 1):
+                if size < MIN_TILE:
+                    self.flat(color)
+                else:
+                    self.get(color, size)
+        for size in piece_sizes:
+            for shape in range(len(SHAPES)):
+                self.piece(shape, size)
+
+    # Drops every image and builds them again at new sizes, when the window scale changed
+    def rebuild(self, sizes, piece_sizes=()):
+        for image in list(self.tiles.values()) + list(self.pieces.values()):
+            self.assets.release(image)
+        self.tiles = {}
+        self.pieces = {}
+        self.bytes = 0
+        self.preload(sizes, piece_sizes)
+
+    # Tile image for a color at a size
+    def get(self, color, size):
+        tile = self.tiles.get((color, size))
+        if tile is not None:
+            self.hits += 1
+            return tile
+
+        self.misses += 1
+        tile = self.assets.scaled(f"Images/color{color}.png", size, size)
+        self.tiles[(color, size)] = tile
+        self.bytes += size * size * 4
+        return tile
+
+    # Average color of a tile, the whole image scaled down to one pixel
+    def flat(self, color):
+        rgb = self.flats.get(color)
+        if rgb is None:
+            w, h, pixel = self.assets.pixels(f"Images/color{color}.png", 1, 1)
+            rgb = self.flats[color] = tuple(pixel[:3])
+        return rgb
+
+    # Image of a whole shape in its spawn rotation, cells without a tile are transparent
+    def piece(self, shape, size):
+        image = self.pieces.get((shape, size))
+        if image is not None:
+            return image
+
+        cells = SHAPES[shape]
+        left = min(x for x, y in cells)
+        top = min(y for x, y in cells)
+        width = (max(x for x, y in cells) - left + 1) * size
+        height = (max(y for x, y in cells) - top + 1) * size
+        w, h, tile = self.assets.pixels(f"Images/color{shape + 1}.png", size, size)
+        pixels = bytearray(width * height * 4)
+        row = size * 4
+        for x, y in cells:
+            for line in range(size):
+                start = (((y - top) * size + line) * width + (x - left) * size) * 4
+                pixels[start:start + row] = tile[line * row:(line + 1) * row]
+
+        image = self.assets.image(bytes(pixels), width, height)
+        self.pieces[(shape, size)] = image
+        self.bytes += len(pixels)
+        return image
+
+    # Counters for hits, misses and memory
+    def stats(self):
+        return {"tiles": len(self.tiles), "hits": self.hits, "misses": self.misses, "bytes": self.bytes}
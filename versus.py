@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import queue
+import random
+import socket
+import struct
+import threading
+import time
+
+from game import Game
+from loop import ACTIONS, FRAME, MAX_CATCH_UP, GameLoop
+from profiler import Histogram
+from replay import read_varint, write_varint
+
+# Head to head over TCP with input delay netcode. Both sides simulate both games from the same seed,
+# so only key presses travel: a press made on frame f is played on frame f + delay on both machines.
+# Every message says up to which frame a side's inputs are final, a side only runs frames it knows
+# both players' inputs for. A network hiccup shorter than the delay costs nothing, a longer one
+# pauses the game (never the window) until the inputs arrive. Garbage needs no messages at all,
+# both machines see the same clears.
+#
+# Messages are length prefixed, the first byte says what they are:
+#   HELLO seed (4 bytes), delay (1 byte)   host -> guest once connected
+#   INPUTS varint final frame, varint count, then (varint frame delta, code byte) per press or release,
+#          code = action number * 2 + 1 if released, like in replays
+#   PING / PONG 8 byte float, echoed back to measure the round trip
+HELLO, INPUTS, PING, PONG = range(4)
+LENGTH = struct.Struct("<H")
+SEED = struct.Struct("<IB")
+STAMP = struct.Struct("<d")
+DELAY = 3  # Frames, 50ms
+DRAW = 2  # winner() when both players top out on the same frame
+PING_FRAMES = 30
+
+
+# A TCP connection run by asyncio on its own thread. The window only calls send() and receive(),
+# neither ever waits on the network. receive() gives None once the other side is gone
+class Link:
+    def __init__(self, jitter=0.0):
+        self.jitter = jitter  # Random extra seconds before a message goes out, for testing
+        self.inbox = queue.SimpleQueue()
+        self.writer = None
+        self.server = None
+        self.last_send = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def host(self, port, address="0.0.0.0"):
+        future = asyncio.run_coroutine_threadsafe(self.serve(address, port), self.loop)
+        return future.result()  # Only waits for the socket to listen
+
+    def join(self, address, port):
+        asyncio.run_coroutine_threadsafe(self.connect(address, port), self.loop)
+
+    async def serve(self, address, port):
+        self.server = await asyncio.start_server(self.connected, address, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def connect(self, address, port):
+        try:
+            reader, writer = await asyncio.open_connection(address, port)
+        except OSError as error:
+            print(f"Error. Could not connect to {address}:{port} ({error})")
+            self.inbox.put(None)
+            return
+        await self.connected(reader, writer)
+
+    async def connected(self, reader, writer):
+        if self.writer is not None:  # Only one opponent
+            writer.close()
+            return
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.writer = writer
+        self.inbox.put(b"")  # Connected
+        try:
+            while True:
+                size = LENGTH.unpack(await reader.readexactly(LENGTH.size))[0]
+                self.inbox.put(await reader.readexactly(size))
+                self.bytes_received += LENGTH.size + size
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        self.inbox.put(None)
+
+    def send(self, payload):
+        data = LENGTH.pack(len(payload)) + payload
+        self.bytes_sent += len(data)
+        if self.jitter:
+            # Later messages never overtake earlier ones (asyncio's clock is time.monotonic)
+            self.last_send = max(self.last_send + 1e-6, time.monotonic() + random.uniform(0, self.jitter))
+            self.loop.call_soon_threadsafe(self.loop.call_at, self.last_send, self.write, data)
+        else:
+            self.loop.call_soon_threadsafe(self.write, data)
+
+    def write(self, data):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(data)
+
+    # Every message that arrived since the last call, b"" means connected, None disconnected
+    def receive(self):
+        messages = []
+        while not self.inbox.empty():
+            messages.append(self.inbox.get())
+        return messages
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def shutdown(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.server is not None:
+            self.server.close()
+        # The readers see the connection end and finish on their own
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=1.0)
+
+
+# Both games of a match and the input exchange. local is 0 on the host and 1 on the guest.
+# press()/release() take the local player's keys, advance() runs the frames that are due and known
+class Match:
+    def __init__(self, seed, local, link, delay=DELAY, clock=time.monotonic):
+        self.seed = seed
+        self.local = local
+        self.remote = 1 - local
+        self.link = link
+        self.delay = delay
+        self.clock = clock
+        self.games = [Game(), Game()]
+        self.loops = [GameLoop(game) for game in self.games]
+        self.games[0].opponent = self.games[1]
+        self.games[1].opponent = self.games[0]
+        for game in self.games:
+            game.reset(seed)  # Same pieces for both players
+            game.new_shape()
+
+        self.frame = 0  # Next frame to run
+        self.inputs = [{}, {}]  # Per player: frame -> input codes
+        self.final = [delay - 1, delay - 1]  # Per player: last frame whose inputs can't change anymore
+        self.outbox = []  # Local (frame, code) not sent yet
+        self.sent = delay - 1  # Last final frame told to the other side
+        self.held = set()
+        self.last = None
+        self.lag = 0.0
+        self.stalls = 0  # Frames that were due but had to wait for the other side
+        self.ping_frame = 0
+        self.round_trips = Histogram()
+        self.disconnected = False
+
+    # The game played on this machine and the other one
+    def game(self):
+        return self.games[self.local]
+
+    def opponent(self):
+        return self.games[self.remote]
+
+    # 0 or 1 once a game is over, the player that is still standing wins, DRAW if neither is
+    def winner(self):
+        if self.disconnected:
+            return self.local
+        over = [game.over for game in self.games]
+        if all(over):
+            return DRAW
+        if any(over):
+            return over.index(False)
+        return None
+
+    def press(self, action):
+        if action not in self.held:
+            self.held.add(action)
+            self.schedule(ACTIONS.index(action) * 2)
+
+    def release(self, action):
+        if action in self.held:
+            self.held.discard(action)
+            self.schedule(ACTIONS.index(action) * 2 + 1)
+
+    def schedule(self, code):
+        frame = self.frame + self.delay
+        self.inputs[self.local].setdefault(frame, []).append(code)
+        self.outbox.append((frame, code))
+
+    # Sends the local inputs and handles everything that came in, never waits
+    def sync(self):
+        self.take(self.link.receive())
+
+        final = self.frame + self.delay - 1  # New presses go at least this far ahead
+        self.final[self.local] = final
+        if self.outbox or final > self.sent:
+            out = bytearray([INPUTS])
+            write_varint(out, final)
+            write_varint(out, len(self.outbox))
+            previous = self.sent + 1
+            for frame, code in self.outbox:
+                write_varint(out, frame - previous)
+                out.append(code)
+                previous = frame
+            self.link.send(bytes(out))
+            self.outbox = []
+            self.sent = final
+
+        if self.frame - self.ping_frame >= PING_FRAMES:
+            self.ping_frame = self.frame
+            self.link.send(bytes([PING]) + STAMP.pack(time.perf_counter()))
+
+    # Handles received messages, also the ones that came in the same batch as HELLO
+    def take(self, messages):
+        for message in messages:
+            if message is None:
+                self.disconnected = True
+            elif message:
+                self.handle(message)
+
+    def handle(self, message):
+        kind = message[0]
+        if kind == INPUTS:
+            final, pos = read_varint(message, 1)
+            count, pos = read_varint(message, pos)
+            frame = self.final[self.remote] + 1
+            for _ in range(count):
+                delta, pos = read_varint(message, pos)
+                frame += delta
+                self.inputs[self.remote].setdefault(frame, []).append(message[pos])
+                pos += 1
+            self.final[self.remote] = final
+        elif kind == PING:
+            self.link.send(bytes([PONG]) + message[1:])
+        elif kind == PONG:
+            self.round_trips.add(time.perf_counter() - STAMP.unpack_from(message, 1)[0])
+
+    # Runs the frames that are due since the last call and whose inputs are known, returns how many ran
+    def advance(self, now=None):
+        now = self.clock() if now is None else now
+        if self.last is None:
+            self.last = now
+        self.lag = min(self.lag + now - self.last, MAX_CATCH_UP * FRAME)
+        self.last = now
+
+        ran = 0
+        while self.lag >= FRAME and self.winner() is None:
+            if self.frame > self.final[self.remote]:  # Still waiting for the other side
+                self.stalls += 1
+                self.lag -= FRAME
+                break
+            self.step()
+            self.lag -= FRAME
+            ran += 1
+        return ran
+
+    # One frame of both games, the inputs for it are final
+    def step(self):
+        for player, loop in enumerate(self.loops):
+            for code in self.inputs[player].pop(self.frame, ()):
+                action = ACTIONS[code >> 1]
+                if code & 1:
+                    loop.release(action)
+                else:
+                    loop.press(action)
+            loop.step()
+        self.frame += 1
+
+    # Network use and timing so far, the one way latency has to fit in the input delay
+    def report(self):
+        frames = max(self.frame, 1)
+        budget = self.delay * FRAME * 1000
+        one_way = self.round_trips.percentile(99) * 500
+        return (f"{frames} frames, {self.link.bytes_sent / frames:.1f} B/frame up, "
+                f"{self.link.bytes_received / frames:.1f} B/frame down, round trip p50 "
+                f"{self.round_trips.percentile(50) * 1000:.1f}ms p99 {self.round_trips.percentile(99) * 1000:.1f}ms, "
+                f"one way p99 {one_way:.1f}ms of a {budget:.0f}ms delay budget "
+                f"({'OK' if one_way <= budget else 'OVER'}), {self.stalls} stalled frames")
+
+
+def hello(seed, delay):
+    return bytes([HELLO]) + SEED.pack(seed, delay)
+
+
+# Seed and delay from the host's HELLO, None for any other message
+def read_hello(message):
+    if message and message[0] == HELLO:
+        return SEED.unpack_from(message, 1)
+    return None
+
+
+# Two matches connected over localhost with random key presses on both sides, checks that both
+# machines end up with the same games. The host presses left before the guest has read HELLO,
+# so the guest gets HELLO and the first INPUTS in one batch
+def loopback(frames, delay, jitter, seed):
+    host_link = Link(jitter)
+    port = host_link.host(0, "127.0.0.1")
+    guest_link = Link(jitter)
+    guest_link.join("127.0.0.1", port)
+
+    host = guest = None
+    while host is None or guest is None:
+        messages = host_link.receive()
+        for i, message in enumerate(messages):
+            if message == b"" and host is None:
+                host_link.send(hello(seed, delay))
+                host = Match(seed, 0, host_link, delay)
+                host.take(messages[i + 1:])
+                host.press("left")
+                host.sync()
+                time.sleep(0.05 + jitter)  # Both messages are in the guest's inbox before it looks
+                break
+        messages = guest_link.receive()
+        for i, message in enumerate(messages):
+            if read_hello(message):
+                guest_seed, guest_delay = read_hello(message)
+                guest = Match(guest_seed, 1, guest_link, guest_delay)
+                guest.take(messages[i + 1:])
+                break
+        time.sleep(0.001)
+
+    rng = random.Random(seed)
+    start = time.monotonic()
+    end = start + frames * FRAME
+    while time.monotonic() < end and host.winner() is None and guest.winner() is None:
+        for match in (host, guest):
+            if rng.random() < 0.03:
+                action = rng.choice(ACTIONS)
+                if action in match.held:
+                    match.release(action)
+                else:
+                    match.press(action)
+            match.sync()
+            match.advance()
+        time.sleep(FRAME / 4)
+
+    # Let the one that is behind catch up to the same frame
+    target = max(host.frame, guest.frame)
+    while min(host.frame, guest.frame) < target and host.winner() is None and guest.winner() is None:
+        for match in (host, guest):
+            match.sync()
+            if match.frame < target and match.frame <= match.final[match.remote]:
+                match.step()
+        time.sleep(0.001)
+
+    same = all((a.board.rows, a.score, a.lines, a.pieces) == (b.board.rows, b.score, b.lines, b.pieces)
+               for a, b in zip(host.games, guest.games)) and host.frame == guest.frame
+    print(f"{'OK' if same else 'MISMATCH'}: frames {host.frame}/{guest.frame}, scores "
+          f"{host.games[0].score} vs {host.games[1].score}, lines {host.games[0].lines} vs {host.games[1].lines}")
+    print("host: " + host.report())
+    print("guest: " + guest.report())
+    host_link.close()
+    guest_link.close()
+    return same
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays a versus match against itself over localhost and "
+                                                 "checks both sides agree, with bandwidth and latency numbers")
+    parser.add_argument("--frames", type=int, default=1800)
+    parser.add_argument("--delay", type=int, default=DELAY, help="input delay in frames")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds per message")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    loopback(args.frames, args.delay, args.jitter, args.seed)